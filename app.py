@@ -1,27 +1,512 @@
+import os
 import uvicorn
-from fastapi import FastAPI
-from typing import List
-from langgraph.graph import END
-from product_search.agent import abot
-from product_search.schema import MCPRequest, MCPResponse, SearchResponse, ToolDefinition
-from product_search.tools import tool_definitions
+import asyncio
+import orjson
+from fastapi import Body, FastAPI, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
+from contextlib import AsyncExitStack
+from typing import Any, Dict, List, Literal, Optional, Tuple
+from product_search.agent import get_agent, reset_agent
+from product_search import llm
+from product_search.schema import MCPRequest, MCPResponse, MCPBatchRequest, MCPBatchResponse, MCPBatchItem, ProductListResponse, SearchResponse, ToolDefinition
+from product_search.schema import LatestPriceResponse, CheapestStoresResponse, PriceHistoryResponse
+from product_search.tools import tool_definitions, recipe_calls, search_products, search_products_filtered, search_similar_products
+from product_search.tools import latest_price, cheapest_stores, price_history
+from product_search.prices import get_price_store, price_store
+from product_search.tool_calls import (TOOL_CALL_MAX_BATCH, PARSE_ERROR, ToolCallError, UnknownToolError, call_tool,
+                                       handle_batch, handle_message, rpc_error)
+from product_search.pagination import CursorError, MAX_PAGE_SIZE
+from product_search.catalog import catalog_manager, get_catalog
+from product_search.concurrency import agent_limiter, LimiterRejected
+from product_search.router import fast_path, fast_path_many, cache_key
+from product_search.cache import make_cache, make_key, cache_stats, MISSING
+from product_search.context import attach_products, has_products, products_by_ref
+from product_search import metrics
+from product_search.metrics import agent_iterations, http_request_seconds, response_parse_seconds, span, timed
 import json
 from pydantic import ValidationError
 
 app = FastAPI()
 
+# End-to-end cache of /mcp responses, keyed by normalized query and catalog version
+response_cache = make_cache(
+    "mcp_responses",
+    maxsize=int(os.getenv("RESPONSE_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("RESPONSE_CACHE_TTL", "600")),
+)
+
+# Largest batch accepted by /mcp/batch, and how many of its queries may run the agent at once
+BATCH_MAX_SIZE = int(os.getenv("MCP_BATCH_MAX_SIZE", "100"))
+BATCH_CONCURRENCY = int(os.getenv("MCP_BATCH_CONCURRENCY", "8"))
+
+# Load the catalog, price history and agent in a background task, so the server answers /healthz at once
+# and /readyz tells the orchestrator when to send traffic (0 finishes loading before the server starts)
+BACKGROUND_WARMUP = os.getenv("MCP_BACKGROUND_WARMUP", "1") != "0"
+
+# What has finished loading, as reported by /readyz
+readiness = {"catalog": False, "prices": False, "agent": False}
+warmup_errors: Dict[str, str] = {}
+warmup_task: Optional[asyncio.Task] = None
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    # Every request is the root span of its trace; for streams the time is until the headers are sent
+    with span("request", method=request.method, path=request.url.path) as root:
+        response = await call_next(request)
+        route = request.scope.get("route")
+        # The route template rather than the path, so ids and unknown paths do not create new series
+        root.set(route=route.path if route is not None else "unmatched", status=response.status_code)
+    http_request_seconds.observe(root.duration, method=request.method, route=root.attributes["route"],
+                                 status=response.status_code)
+    metrics.log_if_slow(root)
+    return response
+
+def service_metrics() -> list:
+    """
+    Gauges read from the catalog, caches and agent limiter when /metrics is scraped.
+    """
+    families = [("mcp_ready", "gauge", "Whether each component has loaded",
+                 [({"component": component}, int(done)) for component, done in readiness.items()])]
+    # Scrapes during warm-up must not wait on (or trigger) the catalog load
+    if readiness["catalog"]:
+        catalog = get_catalog()
+        families.append(("mcp_catalog_rows", "gauge", "Rows in the loaded catalog",
+                         [({"version": catalog.version}, len(catalog))]))
+    families.append(("mcp_price_observations", "gauge", "Observations in the price store", [({}, len(price_store))]))
+    limiter = agent_limiter.stats()
+    families += [
+        ("mcp_agent_in_flight", "gauge", "Agent runs in progress", [({}, limiter["in_flight"])]),
+        ("mcp_agent_waiting", "gauge", "Agent runs queued for a slot", [({}, limiter["waiting"])]),
+        ("mcp_agent_admitted_total", "counter", "Agent runs admitted", [({}, limiter["admitted"])]),
+        ("mcp_agent_rejected_total", "counter", "Agent runs rejected as overloaded", [({}, limiter["rejected"])]),
+        ("mcp_agent_queue_wait_seconds_total", "counter", "Time agent runs spent queued",
+         [({}, limiter["queue_wait_seconds_total"])]),
+    ]
+
+    # Tiered caches report a memory and a store tier; single caches are one tier
+    tiers = []
+    for name, cache in cache_stats().items():
+        if cache.get("backend") == "tiered":
+            tiers += [(name, "memory", cache["memory"]), (name, "store", cache["store"])]
+        else:
+            tiers.append((name, cache.get("backend", ""), cache))
+    for field, kind, help in (("hits", "counter", "Cache hits"), ("misses", "counter", "Cache misses"),
+                              ("evictions", "counter", "Cache evictions"), ("size", "gauge", "Cache entries")):
+        suffix = "_total" if kind == "counter" else ""
+        families.append((f"mcp_cache_{field}{suffix}", kind, help,
+                         [({"cache": name, "tier": tier}, stats[field]) for name, tier, stats in tiers if field in stats]))
+    return families
+
+metrics.collectors.append(service_metrics)
+
+async def current_catalog():
+    """
+    The current catalog, without blocking the event loop: until warm-up has
+    loaded it, get_catalog() waits on the loader's lock, so it runs in a
+    worker thread and /healthz stays responsive.
+    """
+    if readiness["catalog"]:
+        return get_catalog()
+    return await asyncio.to_thread(get_catalog)
+
+async def warm(component: str, load):
+    try:
+        await asyncio.to_thread(load)
+        readiness[component] = True
+    except Exception as e:
+        print(f"Error loading {component}: {e}")
+        warmup_errors[component] = str(e)
+
+async def warm_up():
+    """
+    Loads the catalog (starting the CSV watcher), ingests the price history
+    and builds the agent with its model client, concurrently. Later daily
+    price files are picked up on access.
+    """
+    await asyncio.gather(warm("catalog", catalog_manager.get), warm("prices", get_price_store),
+                         warm("agent", get_agent))
+
+@app.on_event("startup")
+async def start_warm_up():
+    global warmup_task
+    if BACKGROUND_WARMUP:
+        warmup_task = asyncio.create_task(warm_up())
+    else:
+        await warm_up()
+
+@app.on_event("shutdown")
+async def shutdown():
+    if warmup_task is not None and not warmup_task.done():
+        warmup_task.cancel()
+    catalog_manager.stop()
+    # The agent holds model clients built on the shared HTTP clients, so it goes with them
+    await llm.aclose()
+    reset_agent()
+    for component in readiness:
+        readiness[component] = False
+    warmup_errors.clear()
+
+@app.get("/healthz")
+async def healthz():
+    # Liveness: the process is up and its event loop is answering
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    """
+    Readiness: 200 once the catalog with its indexes, the price history and
+    the agent are loaded, 503 until then (or if one of them failed to load).
+    """
+    ready = all(readiness.values())
+    body = {"status": "ready" if ready else "loading", "components": readiness}
+    if readiness["catalog"]:
+        catalog = get_catalog()
+        body["catalog"] = {"version": catalog.version, "rows": len(catalog)}
+    if warmup_errors:
+        body["status"] = "failed"
+        body["errors"] = warmup_errors
+    return Response(content=orjson.dumps(body), status_code=200 if ready else 503, media_type="application/json")
+
 @app.get("/tools/list", response_model=List[ToolDefinition])
 async def list_tools():
     return tool_definitions
 
+@app.post("/tools/call")
+async def rpc_tools_call(request: Request):
+    """
+    JSON-RPC 2.0 endpoint for the MCP `tools/list` and `tools/call` methods.
+    Runs tools directly without the agent. Accepts one request or a batch
+    (an array), whose calls run concurrently and are answered in order.
+    """
+    try:
+        message = orjson.loads(await request.body())
+    except orjson.JSONDecodeError:
+        return Response(content=orjson.dumps(rpc_error(None, PARSE_ERROR, "Parse error")), media_type="application/json")
+
+    if isinstance(message, list):
+        if len(message) > TOOL_CALL_MAX_BATCH:
+            raise HTTPException(status_code=413, detail=f"A batch may contain at most {TOOL_CALL_MAX_BATCH} calls")
+        response = await handle_batch(message)
+    else:
+        response = await handle_message(message)
+    # Nothing to answer when every request was a notification
+    if not response:
+        return Response(status_code=204)
+    return Response(content=orjson.dumps(response), media_type="application/json")
+
+@app.post("/tools/call/{name}")
+async def rest_tools_call(name: str, arguments: Optional[Dict[str, Any]] = Body(None)):
+    # Runs one tool with the JSON body as its arguments and returns the tool's JSON output as-is
+    try:
+        output = await call_tool(name, arguments)
+    except UnknownToolError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ToolCallError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return Response(content=output, media_type="application/json")
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    # Prometheus text format; each worker process keeps and reports its own metrics
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/stats")
+async def stats():
+    catalog = await current_catalog()
+    return {
+        "worker": os.getpid(),
+        "catalog": {"version": catalog.version, "rows": len(catalog)},
+        "prices": price_store.stats(),
+        "limiter": agent_limiter.stats(),
+        "caches": cache_stats(),
+        "recipe_calls": recipe_calls.stats(),
+    }
+
+@app.get("/products/filter", response_model=ProductListResponse)
+async def filter_products(
+    query: Optional[str] = None,
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    min_unit_price: Optional[float] = Query(None, ge=0),
+    max_unit_price: Optional[float] = Query(None, ge=0),
+    brand: Optional[str] = None,
+    aisle: Optional[str] = None,
+    sale_type: Optional[str] = None,
+    unit: Optional[Literal["g", "kg", "ml", "l", "ea"]] = None,
+    sort_by: Optional[Literal["price", "unit_price"]] = None,
+    descending: bool = False,
+    with_links: bool = False,
+    limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+):
+    # Structured search straight against the catalog; no LLM involved
+    results = await asyncio.to_thread(
+        search_products_filtered, query, min_price=min_price, max_price=max_price, min_unit_price=min_unit_price,
+        max_unit_price=max_unit_price, brand=brand, aisle=aisle, sale_type=sale_type, unit=unit, sort_by=sort_by,
+        descending=descending, with_links=with_links, limit=limit,
+    )
+    return Response(content=results.page_json_bytes(), media_type="application/json")
+
+async def product_page(search, name: str, with_links: bool, limit: int, cursor: Optional[str]) -> Response:
+    try:
+        results = await asyncio.to_thread(search, name, with_links=with_links, limit=limit, cursor=cursor)
+    except CursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return Response(content=results.page_json_bytes(), media_type="application/json")
+
+@app.get("/products/search", response_model=ProductListResponse)
+async def search_product_pages(
+    query: str = Query(..., min_length=1),
+    with_links: bool = False,
+    limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+):
+    # Products whose name contains the query, in catalog order; follow next_cursor for more
+    return await product_page(search_products, query, with_links, limit, cursor)
+
+@app.get("/products/similar", response_model=ProductListResponse)
+async def similar_product_pages(
+    product_name: str = Query(..., min_length=1),
+    with_links: bool = False,
+    limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+):
+    # Products most similar to the given one, best first; follow next_cursor for more
+    return await product_page(search_similar_products, product_name, with_links, limit, cursor)
+
+def found(response, product: str):
+    if response is None:
+        raise HTTPException(status_code=404, detail=f"Product '{product}' not found")
+    return response
+
+@app.get("/prices/latest", response_model=LatestPriceResponse)
+async def get_latest_price(product: str = Query(..., min_length=1), store_id: int = Query(...)):
+    # Most recent price of a product (name or code) at one store
+    return found(await asyncio.to_thread(latest_price, product, store_id), product)
+
+@app.get("/prices/cheapest", response_model=CheapestStoresResponse)
+async def get_cheapest_stores(
+    product: str = Query(..., min_length=1),
+    as_of: Optional[int] = Query(None, ge=19000101, le=99991231),
+    limit: int = Query(5, ge=1, le=MAX_PAGE_SIZE),
+):
+    # Stores ranked by their latest price for the product (on or before as_of)
+    return found(await asyncio.to_thread(cheapest_stores, product, as_of, limit), product)
+
+@app.get("/prices/history", response_model=PriceHistoryResponse)
+async def get_price_history(
+    product: str = Query(..., min_length=1),
+    store_id: Optional[int] = None,
+    start: Optional[int] = Query(None, ge=19000101, le=99991231),
+    end: Optional[int] = Query(None, ge=19000101, le=99991231),
+    limit: int = Query(MAX_PAGE_SIZE, ge=0, le=MAX_PAGE_SIZE),
+):
+    # Prices between start and end (YYYYMMDD, inclusive) with min / max / mean over the whole range
+    return found(await asyncio.to_thread(price_history, product, store_id, start, end, limit), product)
+
+def json_response(body: str) -> Response:
+    # Bodies are already-validated MCPResponse JSON; send them as-is instead of re-serializing the model
+    return Response(content=body, media_type="application/json")
+
 @app.post("/mcp", response_model=MCPResponse)
 async def run_agent(request: MCPRequest):
-    messages = [("user", request.query)]
-    result = abot.graph.invoke({"messages": messages})
-    
+    key = make_key((await current_catalog()).version, cache_key(request.query))
+    cached = response_cache.get(key)
+    if cached is not MISSING:
+        return json_response(cached)
+
+    # Simple product lookups are answered locally; everything else goes to the agent
+    routed = await asyncio.to_thread(fast_path, request.query)
+    if routed is not None:
+        body = MCPResponse(data=routed).json()
+        response_cache.set(key, body)
+        return json_response(body)
+
+    try:
+        return json_response((await invoke_agent(request.query, key)).json())
+    except LimiterRejected as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
+
+async def invoke_agent(query: str, key: str) -> MCPResponse:
+    """
+    Runs the LangGraph agent for one query under the concurrency limit and
+    caches the parsed response. Raises LimiterRejected when overloaded.
+    """
+    messages = [("user", query)]
+    async with agent_limiter.slot():
+        result = await get_agent().graph.ainvoke({"messages": messages})
+    agent_iterations.observe(result.get('llm_calls', 0))
+
     # Extract the response from the agent's final state
     agent_response = result['messages'][-1].content
-    
+    search_response, parsed = parse_agent_response(agent_response, products_by_ref(result['messages']))
+
+    response = MCPResponse(data=search_response)
+    if parsed:
+        response_cache.set(key, response.json())
+    return response
+
+@app.post("/mcp/batch", response_model=MCPBatchResponse)
+async def run_batch(request: MCPBatchRequest):
+    """
+    Answers many queries at once. Equivalent queries are answered once, simple
+    product searches share one pass over the name index, and the rest run
+    through the agent concurrently. Results come back in input order, with
+    per-item errors instead of failing the whole batch.
+    """
+    if len(request.requests) > BATCH_MAX_SIZE:
+        raise HTTPException(status_code=413, detail=f"A batch may contain at most {BATCH_MAX_SIZE} queries")
+
+    version = (await current_catalog()).version
+    keys = [make_key(version, cache_key(item.query)) for item in request.requests]
+
+    # One representative query per distinct key
+    unique = {}
+    for key, item in zip(keys, request.requests):
+        unique.setdefault(key, item.query)
+
+    answers = {}
+    pending = []
+    for key, query in unique.items():
+        cached = response_cache.get(key)
+        if cached is not MISSING:
+            answers[key] = MCPBatchItem(data=MCPResponse.parse_raw(cached).data)
+        else:
+            pending.append(key)
+
+    routed = await asyncio.to_thread(fast_path_many, [unique[key] for key in pending])
+    agent_keys = []
+    for key, search_response in zip(pending, routed):
+        if search_response is None:
+            agent_keys.append(key)
+            continue
+        response = MCPResponse(data=search_response)
+        response_cache.set(key, response.json())
+        answers[key] = MCPBatchItem(data=search_response)
+
+    # Bound the batch's share of agent slots so one batch cannot fill the queue
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def answer(key: str) -> MCPBatchItem:
+        async with semaphore:
+            try:
+                return MCPBatchItem(data=(await invoke_agent(unique[key], key)).data)
+            except LimiterRejected as e:
+                return MCPBatchItem(error=str(e))
+            except Exception as e:
+                print(f"Error answering batch query '{unique[key]}': {e}")
+                return MCPBatchItem(error=f"Error running agent: {e}")
+
+    for key, item in zip(agent_keys, await asyncio.gather(*(answer(key) for key in agent_keys))):
+        answers[key] = item
+
+    return MCPBatchResponse(results=[answers[key] for key in keys])
+
+@app.post("/mcp/stream")
+async def stream_agent(request: MCPRequest):
+    """
+    Streams the agent's progress as Server-Sent Events: 'tool_call' when the
+    agent picks a tool, 'tool_result' as each tool returns, 'token' for LLM
+    output tokens and 'final' with the complete MCPResponse.
+    """
+    key = make_key((await current_catalog()).version, cache_key(request.query))
+    cached = response_cache.get(key)
+    if cached is not MISSING:
+        return StreamingResponse(_replay_events(json.loads(cached)), media_type="text/event-stream")
+
+    routed = await asyncio.to_thread(fast_path, request.query)
+    if routed is not None:
+        response = MCPResponse(data=routed)
+        response_cache.set(key, response.json())
+        return StreamingResponse(_replay_events(json.loads(response.json())), media_type="text/event-stream")
+
+    # Take the agent slot before the response starts so rejections are still a 429
+    slot = AsyncExitStack()
+    try:
+        await slot.enter_async_context(agent_limiter.slot())
+    except LimiterRejected as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
+
+    return SlotStreamingResponse(_agent_events(request.query, key, slot), slot, media_type="text/event-stream")
+
+class SlotStreamingResponse(StreamingResponse):
+    """
+    A StreamingResponse that releases the agent slot once the response ends,
+    however it ends. The body generator releases it too when it finishes, but
+    it never runs if the client disconnects or sending fails before the first
+    chunk, and the permit would otherwise leak.
+    """
+
+    def __init__(self, content, slot: AsyncExitStack, **kwargs):
+        super().__init__(content, **kwargs)
+        self.slot = slot
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            # A no-op if the generator already released it
+            await self.slot.aclose()
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def _replay_events(response: dict):
+    products = response['data'].get('products')
+    if products:
+        yield sse_event("tool_result", {"name": None, "content": products})
+    yield sse_event("final", response)
+
+async def _agent_events(query: str, key: str, slot: AsyncExitStack):
+    messages = [("user", query)]
+    agent_response = ""
+    tool_messages = []
+    iterations = 0
+    try:
+        async with slot:
+            async for mode, chunk in get_agent().graph.astream({"messages": messages}, stream_mode=["updates", "messages"]):
+                if mode == "messages":
+                    message, metadata = chunk
+                    if metadata.get("langgraph_node") == "llm" and isinstance(message.content, str) and message.content:
+                        yield sse_event("token", {"content": message.content})
+                    continue
+
+                for node, update in chunk.items():
+                    for message in (update or {}).get('messages', []):
+                        if node == "llm":
+                            iterations += 1
+                            for tool_call in message.tool_calls:
+                                yield sse_event("tool_call", {"id": tool_call['id'], "name": tool_call['name'], "args": tool_call['args']})
+                            agent_response = message.content
+                        elif node == "action":
+                            tool_messages.append(message)
+                            if has_products(message):
+                                # The model saw a compact table; clients get the full records
+                                content = message.artifact['payload']
+                            else:
+                                try:
+                                    content = json.loads(message.content)
+                                except (json.JSONDecodeError, TypeError):
+                                    content = message.content
+                            yield sse_event("tool_result", {"id": message.tool_call_id, "name": message.name, "content": content})
+    except Exception as e:
+        print(f"Error streaming agent response: {e}")
+        yield sse_event("error", {"detail": str(e)})
+        return
+
+    agent_iterations.observe(iterations)
+    search_response, parsed = parse_agent_response(agent_response, products_by_ref(tool_messages))
+    response = MCPResponse(data=search_response)
+    if parsed:
+        response_cache.set(key, response.json())
+    yield sse_event("final", json.loads(response.json()))
+
+@timed("parse_response", response_parse_seconds)
+def parse_agent_response(agent_response: str, products: Optional[Dict[str, dict]] = None) -> Tuple[SearchResponse, bool]:
+    """
+    Converts the agent's final message into a SearchResponse, replacing the
+    product refs it names with the full records in `products`. Returns the
+    response and whether the message parsed cleanly.
+    """
     # The agent's response is now expected to be a JSON string that maps directly
     # to the SearchResponse schema.
     try:
@@ -32,7 +517,7 @@ async def run_agent(request: MCPRequest):
         # We'll construct the SearchResponse with a default summary.
         if isinstance(search_response_data, list):
             search_response = SearchResponse(
-                products=search_response_data,
+                products=attach_products({'products': search_response_data}, products or {})['products'],
                 summary="Found products."
             )
         # If the agent returns a dictionary, it should match the SearchResponse schema.
@@ -44,6 +529,8 @@ async def run_agent(request: MCPRequest):
             # If 'summary' is not in the response, create a default one
             if 'summary' not in search_response_data:
                 search_response_data['summary'] = "No summary provided."
+
+            attach_products(search_response_data, products or {})
             
             search_response = SearchResponse(**search_response_data)
         else:
@@ -52,9 +539,9 @@ async def run_agent(request: MCPRequest):
 
     except (json.JSONDecodeError, TypeError, ValidationError) as e:
         # If parsing or validation fails, treat the entire response as a summary
-        search_response = SearchResponse(summary=f"Error parsing agent response: {agent_response}")
+        return SearchResponse(summary=f"Error parsing agent response: {agent_response}"), False
 
-    return MCPResponse(data=search_response)
+    return search_response, True
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
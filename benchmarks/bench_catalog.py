@@ -0,0 +1,156 @@
+"""
+Catalog scaling: build time, memory and search latency on synthetic catalogs
+of increasing size, so regressions in the search paths show up offline.
+
+Synthetic products are variants of the real ones ("Shredded Medium Cheddar
+Smoked"), each stocked in about 20 stores, with the real aisles, brands,
+package sizes and jittered prices. Sizes accept k / m suffixes.
+
+    python -m benchmarks.bench_catalog [--sizes 10k,100k,1m] [--rounds 200] [--snapshot]
+
+10m rows needs several GB of memory to build.
+"""
+import os
+import time
+import random
+import argparse
+import tempfile
+import numpy as np
+import pandas as pd
+from benchmarks.common import percentiles, print_table, quiet, rss_mb
+from product_search.catalog import CSV_PATH, Catalog, build_frame, normalize_column
+from product_search.snapshot import load_snapshot, write_snapshot
+
+STORES_PER_PRODUCT = 20
+
+
+def parse_size(text: str) -> int:
+    text = text.strip().lower()
+    scale = {"k": 1_000, "m": 1_000_000}.get(text[-1:], 1)
+    return int(float(text.rstrip("km")) * scale)
+
+
+def synthetic_frame(base: pd.DataFrame, rows: int, seed: int = 0) -> pd.DataFrame:
+    """
+    A raw catalog frame with `rows` rows built from the real products, whose
+    columns are already normalized (see normalize_column).
+    """
+    rng = np.random.default_rng(seed)
+    products = base.drop_duplicates("code").reset_index(drop=True)
+    vocabulary = np.asarray(sorted({word for name in products["name"] for word in str(name).split()
+                                    if word.isalpha() and len(word) > 3}), dtype=object)
+    stores = base["store_id"].unique()
+
+    count = max(1, rows // STORES_PER_PRODUCT)
+    parents = rng.integers(len(products), size=count)
+    variants = vocabulary[rng.integers(len(vocabulary), size=count)]
+    names = products["name"].to_numpy(dtype=object)[parents] + " " + variants
+    prices = np.round(products["price"].to_numpy()[parents] * rng.uniform(0.7, 1.3, size=count), 2)
+
+    product = rng.integers(count, size=rows)
+    special = rng.random(rows) < 0.1
+    parent = parents[product]
+    article = (10**9 + product).astype(str).astype(object)
+    return pd.DataFrame({
+        "date": np.full(rows, 20240523),
+        "store_id": rng.choice(stores, size=rows),
+        "code": article + "_EA",
+        "article_number": article,
+        "name": names[product],
+        "aisle": products["aisle"].to_numpy(dtype=object)[parent],
+        "brand": products["brand"].to_numpy(dtype=object)[parent],
+        "package_size": products["package_size"].to_numpy(dtype=object)[parent],
+        "price": np.round(prices[product] * np.where(special, 0.85, 1.0), 2),
+        "unit": products["unit"].to_numpy(dtype=object)[parent],
+        "sale_type": np.where(special, "SPECIAL", "REGULAR"),
+    })
+
+
+def time_each(fn, arguments) -> dict:
+    samples = []
+    for args in arguments:
+        start = time.perf_counter()
+        fn(*args)
+        samples.append(time.perf_counter() - start)
+    return percentiles(samples)
+
+
+def bench(catalog, rounds: int, seed: int = 0) -> list:
+    """
+    Latency of the catalog's search paths over `rounds` sampled queries each.
+    """
+    rng = random.Random(seed)
+    rows = [rng.randrange(len(catalog)) for _ in range(rounds)]
+    names = [catalog.columns["name"][row] for row in rows]
+    words = [rng.choice(name.split()).lower() for name in names]
+    typos = [word[:len(word) // 2] + word[len(word) // 2 + 1:] if len(word) > 4 else word for word in words]
+    middle = len(catalog) // 2
+
+    index, similarity, filters = catalog.index, catalog.similarity, catalog.filters
+    # Fuzzy search merges the posting lists of every query trigram, which grow with the catalog,
+    # before scoring its candidates; fewer rounds keep large sizes tractable
+    fuzzy_rounds = max(5, rounds // 10)
+    return [
+        ["name search", time_each(index.search, [(word, 10) for word in words])],
+        ["name search, deep page", time_each(lambda word: index.search(word, 10, after=middle), [(w,) for w in words])],
+        ["exact name lookup", time_each(index.find, [(name.lower(),) for name in names])],
+        ["fuzzy search", time_each(index.fuzzy_search, [(typo, 10) for typo in typos[:fuzzy_rounds]])],
+        ["similar products", time_each(lambda row: similarity.neighbours(row, depth=11), [(row,) for row in rows])],
+        ["filter, price range", time_each(lambda low: filters.search(min_price=low, max_price=low + 1, limit=10),
+                                          [(rng.uniform(1, 10),) for _ in range(rounds)])],
+        ["filter, unit price by g", time_each(lambda: filters.search(unit="g", sort_by="unit_price", limit=10),
+                                              [() for _ in range(rounds)])],
+        ["filter, name + sale", time_each(lambda word: filters.search(query=word, sale_type="SPECIAL", limit=10),
+                                          [(word,) for word in words])],
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--csv", default=CSV_PATH, help="real product CSV the synthetic catalogs are built from")
+    parser.add_argument("--sizes", default="10k,100k,1m")
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--snapshot", action="store_true", help="also time writing and memory-mapping a snapshot")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.csv):
+        raise SystemExit(f"CSV file not found at: {args.csv}")
+    base = pd.read_csv(args.csv, dtype={"Article Number": str, "Code": str})
+    base.columns = [normalize_column(col) for col in base.columns]
+
+    summary = []
+    for size in (parse_size(text) for text in args.sizes.split(",")):
+        raw = synthetic_frame(base, size)
+        rss_before = rss_mb()
+        start = time.perf_counter()
+        with quiet():
+            catalog = Catalog.from_frame(build_frame(raw), version=f"synthetic-{size}")
+        build = time.perf_counter() - start
+        del raw
+        row = [f"{len(catalog):,}", build, rss_mb() - rss_before]
+
+        if args.snapshot:
+            with tempfile.TemporaryDirectory() as directory:
+                start = time.perf_counter()
+                path = write_snapshot(catalog, directory)
+                written = time.perf_counter() - start
+                start = time.perf_counter()
+                catalog = load_snapshot(path)
+                row += [written, time.perf_counter() - start]
+                results = bench(catalog, args.rounds)
+        else:
+            results = bench(catalog, args.rounds)
+        summary.append(row)
+
+        print(f"\n{len(catalog):,} rows")
+        print_table(["operation (ms)", "p50", "p95", "p99"],
+                    [[name, stats["p50"], stats["p95"], stats["p99"]] for name, stats in results])
+        del catalog
+
+    print()
+    columns = ["rows", "build s", "memory MB"] + (["snapshot write s", "snapshot load s"] if args.snapshot else [])
+    print_table(columns, summary)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Concurrent load on POST /mcp, with the agent's LLM replaced by the scripted
+model (see benchmarks/fake_llm.py), so runs are repeatable and free.
+
+The app runs in-process behind an ASGI transport. Queries are generated
+from words in the catalog's product names, with a mix of simple searches
+the router answers directly ("milk") and multi-item questions that go
+through the agent and its tools ("could you compare milk, eggs and
+bread?"). Each query is distinct, so the response cache does not hide the
+work unless --repeat is given.
+
+    python -m benchmarks.bench_load [--requests 500] [--concurrency 32] [--latency 0.05]
+                                    [--agent-share 0.5] [--repeat 1] [--trace-memory]
+"""
+import time
+import random
+import asyncio
+import argparse
+import tracemalloc
+from collections import Counter
+from typing import List
+import httpx
+from benchmarks.fake_llm import install
+from benchmarks.common import peak_rss_mb, percentiles, print_table, quiet, rss_mb
+
+
+def make_queries(catalog, count: int, agent_share: float, repeat: int, seed: int = 0) -> List[str]:
+    """
+    `count` queries, `agent_share` of them needing the agent; each distinct
+    query is asked `repeat` times.
+    """
+    rng = random.Random(seed)
+    words = sorted({word.lower() for name in catalog.columns["name"].values for word in name.split()
+                    if word.isalpha() and len(word) > 3})
+    distinct = max(1, count // max(repeat, 1))
+    queries = []
+    for i in range(distinct):
+        if rng.random() < agent_share:
+            a, b, c = rng.sample(words, 3)
+            queries.append(f"could you compare {a}, {b} and {c} for me? ({i})")
+        else:
+            queries.append(f"find me some {rng.choice(words)} {rng.choice(words)}")
+    queries = (queries * max(repeat, 1))[:count]
+    rng.shuffle(queries)
+    return queries
+
+
+async def drive(app, queries: List[str], concurrency: int) -> dict:
+    transport = httpx.ASGITransport(app=app)
+    latencies, statuses = [], Counter()
+    pending = iter(queries)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        async def worker():
+            for query in pending:
+                start = time.perf_counter()
+                response = await client.post("/mcp", json={"query": query})
+                latencies.append(time.perf_counter() - start)
+                statuses[response.status_code] += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    return {"latencies": latencies, "statuses": statuses, "elapsed": elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per scripted LLM call")
+    parser.add_argument("--agent-share", type=float, default=0.5, help="fraction of queries that need the agent")
+    parser.add_argument("--repeat", type=int, default=1, help="times each distinct query is asked")
+    parser.add_argument("--trace-memory", action="store_true", help="measure Python allocations (slower)")
+    args = parser.parse_args()
+
+    install(latency=args.latency)
+    # The agent is built on first use, so it picks up the scripted model
+    from app import app
+    from product_search.catalog import catalog_manager
+    from product_search.prices import get_price_store
+
+    catalog = catalog_manager.get()
+    get_price_store()
+    queries = make_queries(catalog, args.requests, args.agent_share, args.repeat)
+
+    # Warm up imports, indexes and thread pools outside the measurement
+    with quiet():
+        asyncio.run(drive(app, queries[:min(10, len(queries))], 2))
+
+    rss_before = rss_mb()
+    if args.trace_memory:
+        tracemalloc.start()
+    with quiet():
+        result = asyncio.run(drive(app, queries, args.concurrency))
+    traced_peak = tracemalloc.get_traced_memory()[1] / 2**20 if args.trace_memory else None
+    tracemalloc.stop()
+    rss_after = rss_mb()
+
+    stats = percentiles(result["latencies"])
+    print(f"catalog: {len(catalog)} rows, LLM latency {args.latency * 1000:.0f} ms, "
+          f"{args.agent_share:.0%} agent queries, concurrency {args.concurrency}")
+    print(f"statuses: {dict(result['statuses'])}")
+    print_table(
+        ["requests", "req/s", "p50 ms", "p95 ms", "p99 ms", "mean ms"],
+        [[len(queries), len(queries) / result["elapsed"], stats["p50"], stats["p95"], stats["p99"], stats["mean"]]],
+    )
+    print(f"rss: {rss_before:.1f} -> {rss_after:.1f} MB (peak {peak_rss_mb():.1f} MB), "
+          f"{(rss_after - rss_before) * 1024 / len(queries):.1f} KB retained per request")
+    if traced_peak is not None:
+        print(f"traced Python allocations: peak {traced_peak:.1f} MB, "
+              f"{traced_peak * 1024 / args.concurrency:.1f} KB per in-flight request")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Microbenchmark for the search result serialization path.
+
+Compares the previous pipeline (DataFrame -> to_dict('records') -> Product ->
+ProductResponse -> json.dumps, then json.loads to check for emptiness) with
+ProductResults, which encodes rows straight from the catalog columns.
+
+    python -m benchmarks.bench_serialization [--rounds 2000]
+"""
+import json
+import time
+import argparse
+import pandas as pd
+from product_search.catalog import COLUMNS, CategoryColumn, get_catalog
+from product_search.results import ProductResults
+from product_search.schema import Product, ProductResponse
+
+
+def catalog_frame(catalog) -> pd.DataFrame:
+    # The catalog as the DataFrame the previous pipeline served rows from
+    return pd.DataFrame({
+        col: column.to_categorical() if isinstance(column, CategoryColumn) else column
+        for col, column in catalog.columns.items()
+    }, columns=COLUMNS)
+
+
+def legacy_serialize(frame, rows, with_links=False) -> str:
+    df = frame.iloc[rows]
+    if df.empty:
+        return json.dumps([])
+    records = df.to_dict('records')
+    if not with_links:
+        for record in records:
+            record['product_link'] = None
+    products = [Product(**record) for record in records]
+    response_products = [ProductResponse(**p.dict()) for p in products]
+    products_json = json.dumps([p.dict() for p in response_products])
+    # graph.py parsed the string again just to check for emptiness
+    json.loads(products_json)
+    return products_json
+
+
+def lean_serialize(catalog, rows, with_links=False) -> str:
+    results = ProductResults(catalog, rows, with_links=with_links)
+    if results.empty:
+        return "[]"
+    return results.json()
+
+
+def per_result_us(fn, source, rows, rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn(source, rows, with_links=True)
+    return (time.perf_counter() - start) / (rounds * len(rows)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    catalog = get_catalog()
+    rows = catalog.index.search("cheese", limit=10)
+    if not rows:
+        raise SystemExit("Catalog is empty; set PRODUCT_CSV_PATH to the product CSV")
+
+    frame = catalog_frame(catalog)
+    for with_links in (False, True):
+        assert json.loads(legacy_serialize(frame, rows, with_links)) == json.loads(lean_serialize(catalog, rows, with_links))
+
+    legacy = per_result_us(legacy_serialize, frame, rows, args.rounds)
+    lean = per_result_us(lean_serialize, catalog, rows, args.rounds)
+    print(f"{'pipeline':<10} {'us/result':>10}")
+    print(f"{'legacy':<10} {legacy:>10.2f}")
+    print(f"{'lean':<10} {lean:>10.2f}")
+    print(f"speedup: {legacy / lean:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Latency of each agent tool called directly, with the recipe LLM replaced by
+the scripted model (see benchmarks/fake_llm.py).
+
+Every tool runs over the same deterministic set of arguments twice: "cold"
+clears the result caches before each call, so it measures the search path
+itself, and "warm" repeats the calls against a filled cache.
+
+    python -m benchmarks.bench_tools [--rounds 20] [--queries 50] [--latency 0]
+"""
+import time
+import random
+import asyncio
+import argparse
+from benchmarks.fake_llm import install
+from benchmarks.common import percentiles, print_table, quiet
+from product_search import tools
+from product_search.cache import caches
+from product_search.catalog import get_catalog
+from product_search.prices import get_price_store
+
+
+def sample_arguments(catalog, count: int, seed: int = 0) -> dict:
+    """
+    Deterministic arguments for each tool, drawn from the catalog's own names.
+    """
+    rng = random.Random(seed)
+    rows = [rng.randrange(len(catalog)) for _ in range(count)]
+    names = [catalog.columns["name"][row] for row in rows]
+    codes = [catalog.columns["code"][row] for row in rows]
+    stores = [int(catalog.columns["store_id"][row]) for row in rows]
+    words = [rng.choice(name.split()) for name in names]
+    # Drop a letter so fuzzy matching has something to correct
+    typos = [word[:len(word) // 2] + word[len(word) // 2 + 1:] if len(word) > 4 else word for word in words]
+    return {
+        "get_products": [(word,) for word in words],
+        "get_products_fuzzy": [(typo,) for typo in typos],
+        "get_similar_products": [(name,) for name in names],
+        "get_products_filtered": [(word, None, 10.0) for word in words] + [(None, 2.0, 8.0) for _ in range(count // 4)],
+        "get_products_with_links": [(word,) for word in words],
+        "get_latest_price": list(zip(codes, stores)),
+        "get_cheapest_stores": [(code,) for code in codes],
+        "get_price_history": [(code,) for code in codes],
+        "get_nutritional_info": [(name,) for name in names],
+        "get_recipe": [([word, rng.choice(words)],) for word in words[:max(1, count // 5)]],
+    }
+
+
+def run(name: str, arguments: list, rounds: int, cold: bool) -> list:
+    fn = getattr(tools, name)
+    samples = []
+    for _ in range(rounds):
+        for args in arguments:
+            if cold:
+                for cache in caches.values():
+                    cache.clear()
+            start = time.perf_counter()
+            if name == "get_recipe":
+                asyncio.run(tools.aget_recipe(*args))
+            else:
+                fn(*args)
+            samples.append(time.perf_counter() - start)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--queries", type=int, default=50, help="distinct arguments per tool")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per scripted LLM call")
+    args = parser.parse_args()
+
+    install(latency=args.latency)
+    catalog = get_catalog()
+    if len(catalog) == 0:
+        raise SystemExit("Catalog is empty; set PRODUCT_CSV_PATH to the product CSV")
+    get_price_store()
+    print(f"catalog: {len(catalog)} rows (version {catalog.version})")
+
+    rows = []
+    for name, arguments in sample_arguments(catalog, args.queries).items():
+        with quiet():
+            cold = percentiles(run(name, arguments, 1, cold=True))
+            warm = percentiles(run(name, arguments, args.rounds, cold=False))
+        rows.append([name, cold["p50"], cold["p95"], cold["p99"], warm["p50"], warm["p95"], warm["p99"]])
+    print_table(["tool (ms)", "cold p50", "cold p95", "cold p99", "warm p50", "warm p95", "warm p99"], rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Helpers shared by the benchmarks: latency percentiles, process memory and
+table output.
+"""
+import os
+import time
+import resource
+import contextlib
+from typing import Callable, Dict, List, Sequence
+
+import numpy as np
+
+
+def percentiles(samples: Sequence[float]) -> Dict[str, float]:
+    """
+    p50 / p95 / p99 and mean of latency samples, in milliseconds.
+    """
+    if not samples:
+        return {"p50": float("nan"), "p95": float("nan"), "p99": float("nan"), "mean": float("nan")}
+    ms = np.asarray(samples) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {"p50": p50, "p95": p95, "p99": p99, "mean": float(ms.mean())}
+
+
+def time_calls(fn: Callable, args_list: List[tuple], rounds: int = 1) -> List[float]:
+    """
+    Calls fn with each argument tuple `rounds` times and returns per-call seconds.
+    """
+    samples = []
+    for _ in range(rounds):
+        for args in args_list:
+            start = time.perf_counter()
+            fn(*args)
+            samples.append(time.perf_counter() - start)
+    return samples
+
+
+@contextlib.contextmanager
+def quiet():
+    # Catalog loads and tool errors are printed; keep that out of the measurements' output
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def rss_mb() -> float:
+    # Current resident set size; falls back to the peak where /proc is not available
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        return peak_rss_mb()
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def print_table(columns: List[str], rows: List[list]):
+    """
+    Prints rows as aligned columns; floats with two decimals.
+    """
+    cells = [[f"{value:.2f}" if isinstance(value, float) else str(value) for value in row] for row in rows]
+    widths = [max([len(column)] + [len(row[i]) for row in cells]) for i, column in enumerate(columns)]
+    print("  ".join(column.ljust(width) if i == 0 else column.rjust(width)
+                    for i, (column, width) in enumerate(zip(columns, widths))))
+    for row in cells:
+        print("  ".join(cell.ljust(width) if i == 0 else cell.rjust(width)
+                        for i, (cell, width) in enumerate(zip(row, widths))))
@@ -0,0 +1,101 @@
+"""
+Deterministic stand-in for ChatOpenAI, so the benchmarks run the real agent
+graph, tools and endpoints without calling the OpenAI API.
+
+The model follows a fixed script: for a user query it calls `product_search`
+once per item ("milk, eggs and bread" -> three calls in one step), and once
+tool results are in it answers with the refs of the first products found.
+Recipe prompts get a canned recipe. Every call waits `latency` seconds to
+stand in for the API round trip.
+"""
+import re
+import json
+import time
+import asyncio
+from typing import Any, List, Optional
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+ITEM_SPLIT_RE = re.compile(r",|;|\band\b|\bor\b")
+LEAD_IN_RE = re.compile(r"^(?:.*?\b(?:compare|find|show|get|search for|looking for)\b)\s*", re.IGNORECASE)
+
+RECIPE = """Title: Benchmark Skillet
+Ingredients:
+- {ingredients}
+Instructions:
+Combine everything in a pan and cook until done."""
+
+
+class ScriptedChatModel(BaseChatModel):
+    latency: float = 0.0
+    max_products: int = 5
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def bind_tools(self, tools, **kwargs) -> "ScriptedChatModel":
+        # The script decides when to call tools, so tool_choice is ignored
+        return self
+
+    def _respond(self, messages: List[BaseMessage]) -> AIMessage:
+        last_user = max((i for i, m in enumerate(messages) if isinstance(m, HumanMessage)), default=-1)
+        results = [m for m in messages[last_user + 1:] if isinstance(m, ToolMessage)]
+        if results:
+            return AIMessage(content=json.dumps({
+                "products": _refs(results)[:self.max_products],
+                "summary": f"Found products in {len(results)} tool result(s).",
+            }))
+
+        text = str(messages[last_user].content) if last_user >= 0 else ""
+        if text.startswith("Create a simple recipe using the following ingredients:"):
+            ingredients = text.split(":", 1)[1].split(".")[0].strip()
+            return AIMessage(content=RECIPE.format(ingredients=ingredients.replace(", ", "\n- ")))
+
+        items = [item.strip(" ?.!") for item in ITEM_SPLIT_RE.split(LEAD_IN_RE.sub("", text))]
+        tool_calls = [
+            {"name": "product_search", "args": {"query": item}, "id": f"call_{i}"}
+            for i, item in enumerate(item for item in items if item)
+        ]
+        return AIMessage(content="", tool_calls=tool_calls)
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None,
+                  **kwargs: Any) -> ChatResult:
+        if self.latency:
+            time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._respond(messages))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None,
+                         **kwargs: Any) -> ChatResult:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._respond(messages))])
+
+
+def _refs(results: List[ToolMessage]) -> list:
+    # Refs from compact tables, or the products themselves when compaction is off
+    refs = []
+    for message in results:
+        try:
+            payload = json.loads(message.content)
+        except (json.JSONDecodeError, TypeError):
+            continue
+        if isinstance(payload, dict) and "rows" in payload:
+            refs.extend(row[0] for row in payload["rows"])
+        elif isinstance(payload, dict) and isinstance(payload.get("products"), list):
+            refs.extend(payload["products"])
+    return refs
+
+
+def install(latency: float = 0.0) -> ScriptedChatModel:
+    """
+    Swaps the agent's model and the recipe tool's LLM for a scripted one.
+    """
+    from product_search import agent, llm
+    model = ScriptedChatModel(latency=latency)
+    llm.set_chat_model("agent", model)
+    llm.set_chat_model("recipe", model)
+    # An agent built before now is rebuilt around the scripted model on next use
+    agent.reset_agent()
+    return model
@@ -1,22 +1,50 @@
+import os
+import asyncio
 import operator
+import threading
 from typing import TypedDict, Annotated
-from langchain_core.messages import BaseMessage
-from langgraph.graph import StateGraph, END
-from langgraph.prebuilt import ToolNode
-from langchain_openai import ChatOpenAI
-from .graph import tools
+from langchain_core.messages import BaseMessage, ToolMessage
+from langchain_core.runnables import RunnableConfig
+from .llm import chat_model
+from .context import COMPACT_TOOL_RESULTS, compact_tool_result, next_ref, token_usage, trim_tool_results
+from .metrics import agent_node_seconds, record_llm_usage, span, timed, tool_seconds
+
+# How many tool calls from one agent step may run at once
+TOOL_CONCURRENCY = int(os.getenv("AGENT_TOOL_CONCURRENCY", "4"))
+
+# Seconds a tool call may take before the model gets an error result for it instead (0 disables)
+TOOL_TIMEOUT = float(os.getenv("AGENT_TOOL_TIMEOUT", "30"))
+
+# Most model calls per query; the last one must answer without tools
+MAX_ITERATIONS = int(os.getenv("AGENT_MAX_ITERATIONS", "6"))
+
+# Tokens (prompt + completion, summed over the model calls) after which the agent must answer (0 disables)
+MAX_TOKENS = int(os.getenv("AGENT_MAX_TOKENS", "30000"))
+
+BUDGET_NOTE = "The tool budget for this request is used up. Answer now from the results you already have."
 
 # The agent state
 class AgentState(TypedDict):
     messages: Annotated[list, operator.add]
+    llm_calls: Annotated[int, operator.add]
+    tokens: Annotated[int, operator.add]
 
 # The agent
 class Agent:
-    def __init__(self, model, system=""):
+    def __init__(self, model, system="", tool_concurrency=TOOL_CONCURRENCY, tool_timeout=TOOL_TIMEOUT,
+                 max_iterations=MAX_ITERATIONS, max_tokens=MAX_TOKENS):
+        # Imported here so importing the app does not load LangGraph and the tool wrappers before the agent is first needed
+        from langgraph.graph import StateGraph, END
+        from .graph import tools
         self.system = system
+        self.max_iterations = max(1, max_iterations)
+        self.max_tokens = max_tokens
+        self.tools = {t.name: t for t in tools}
+        self.tool_concurrency = max(1, tool_concurrency)
+        self.tool_timeout = tool_timeout
         graph = StateGraph(AgentState)
         graph.add_node("llm", self.call_openai)
-        graph.add_node("action", ToolNode(tools))
+        graph.add_node("action", self.take_action)
         graph.add_conditional_edges(
             "llm",
             self.exists_action,
@@ -26,6 +54,13 @@ class Agent:
         graph.set_entry_point("llm")
         self.graph = graph.compile()
         self.model = model.bind_tools(tools)
+        # Same tools, but the model may not call them: used for the answer once the budget is spent
+        self.final_model = model.bind_tools(tools, tool_choice="none")
+
+    def out_of_budget(self, state: AgentState) -> bool:
+        # True when the next model call has to be the last one
+        return state.get('llm_calls', 0) + 1 >= self.max_iterations or \
+            (self.max_tokens > 0 and state.get('tokens', 0) >= self.max_tokens)
 
     def exists_action(self, state: AgentState):
         result = state['messages'][-1]
@@ -33,26 +68,135 @@ class Agent:
             return "action"
         return "__end__"
 
-    def call_openai(self, state: AgentState):
-        messages = state['messages']
-        if self.system:
-            messages = [("system", self.system)] + messages
-        message = self.model.invoke(messages)
-        return {'messages': [message]}
+    async def call_openai(self, state: AgentState, config: RunnableConfig):
+        with span("llm", agent_node_seconds, node="llm") as node:
+            # Older tool results are sent condensed; the state keeps them in full
+            messages = trim_tool_results(state['messages'])
+            if self.system:
+                messages = [("system", self.system)] + messages
+            final = self.out_of_budget(state)
+            if final:
+                messages = messages + [("system", BUDGET_NOTE)]
+            # Passing the config through lets graph.astream() surface the LLM's tokens as they arrive
+            message = await (self.final_model if final else self.model).ainvoke(messages, config=config)
+            if final and message.tool_calls:
+                # Out of budget: any further tool requests are dropped so the run ends here; the copy
+                # keeps the id and usage_metadata, so this call's tokens still count against the cap
+                additional_kwargs = {k: v for k, v in message.additional_kwargs.items() if k != "tool_calls"}
+                message = message.model_copy(update={"tool_calls": [], "invalid_tool_calls": [],
+                                                     "additional_kwargs": additional_kwargs})
+            tokens = token_usage(message, messages)
+            record_llm_usage(message, tokens)
+            node.set(final=final, tool_calls=len(message.tool_calls))
+        return {'messages': [message], 'llm_calls': 1, 'tokens': tokens}
+
+    @timed("action", agent_node_seconds, node="action")
+    async def take_action(self, state: AgentState, config: RunnableConfig):
+        """
+        Runs the tool calls of the last model message concurrently.
+
+        The tools are async and run catalog lookups in worker threads, so
+        independent calls overlap; at most `tool_concurrency` run at once and
+        each gets `tool_timeout` seconds. A failing or timed-out call becomes
+        an error result for the model rather than failing the step. Results
+        keep the tool-call order, so each ToolMessage follows the request
+        that asked for it. Product results reach the model as compact tables
+        of refs, with the full records kept as the message artifact.
+        """
+        semaphore = asyncio.Semaphore(self.tool_concurrency)
+
+        async def run(tool_call) -> ToolMessage:
+            name = tool_call['name']
+            tool = self.tools.get(name)
+            if tool is None:
+                content = f"Error: {name} is not a valid tool, try one of [{', '.join(self.tools)}]."
+            else:
+                async with semaphore:
+                    outcome = "ok"
+                    # Timed from when the call gets a slot, so waiting on the semaphore is not counted
+                    with span(name, tool_seconds, tool=name) as tool_span:
+                        try:
+                            # A timed-out lookup keeps running in its worker thread, but the step stops waiting for it
+                            content = await asyncio.wait_for(tool.ainvoke(tool_call['args'], config=config),
+                                                             timeout=self.tool_timeout or None)
+                        except asyncio.TimeoutError:
+                            print(f"Tool {name} timed out after {self.tool_timeout:g}s")
+                            content = f"Error: {name} timed out after {self.tool_timeout:g} seconds."
+                            outcome = "timeout"
+                        except Exception as e:
+                            print(f"Error running tool {name}: {e}")
+                            content = f"Error: {e!r}\n Please fix your mistakes."
+                            outcome = "error"
+                        tool_span.set(outcome=outcome)
+            return ToolMessage(content=content, name=name, tool_call_id=tool_call['id'])
+
+        tool_calls = state['messages'][-1].tool_calls
+        results = await asyncio.gather(*(run(tool_call) for tool_call in tool_calls))
+        if not COMPACT_TOOL_RESULTS:
+            return {'messages': list(results)}
+
+        # Refs are numbered in tool-call order, continuing from earlier steps
+        first_ref = next_ref(state['messages'])
+        messages = []
+        for result in results:
+            content, artifact = compact_tool_result(result.content, first_ref)
+            if artifact is not None:
+                first_ref += len(artifact['refs'])
+            messages.append(ToolMessage(content=content, artifact=artifact, name=result.name,
+                                        tool_call_id=result.tool_call_id))
+        return {'messages': messages}
 
 
 # Create the agent
-prompt = """You are a smart research assistant. Use the search engine to look up information. \
+_prompt_head = """You are a smart research assistant. Use the search engine to look up information. \
 You are allowed to make multiple calls (either together or in sequence). \
 Only look up information when you are asked to do so. \
-When you receive search results, they will be in a JSON format. \
-Your task is to interpret these results and provide a concise summary, while also returning the structured product data. \
+Your task is to interpret the search results and provide a concise summary, while also returning the structured product data. \
 If the user asks for a link, use the 'product_search_with_links' or 'similar_products_search_with_links' tool. \
 If the user does not ask for a link, use the 'product_search' or 'similar_products_search' tool. \
+If 'product_search' finds nothing or the query looks misspelled, use the 'fuzzy_product_search' tool. \
+Search results come one page at a time; if the user asks for more, call the same tool again with the page's 'next_cursor' as 'cursor'. \
+For price limits, sale items, brands, aisles or cheapest / best value requests, use the 'filtered_product_search' tool \
+(sort_by 'unit_price' compares value per 100 g, 100 ml or 1 ea). \
+For a product's price at a given store, which store sells it cheapest, or how its price changed over time, \
+use the 'latest_price_lookup', 'cheapest_store_finder' or 'price_history_lookup' tool. \
+"""
+
+# Compacted results reach the model as ref tables, and the answer names refs that are swapped for the full records
+_prompt_refs = """Product search results come as tables whose rows start with a ref such as "p3". \
+Your final output should be a JSON object with two keys: 'products' and 'summary'. \
+The 'products' key should contain the list of refs of the products you are returning (e.g. ["p1", "p4"]); \
+their full details are attached for you. \
+"""
+
+_prompt_records = """When you receive search results, they will be in a JSON format. \
 Your final output should be a JSON object with two keys: 'products' and 'summary'. \
 The 'products' key should contain the list of products from the search results. \
-The 'summary' key should contain a human-readable summary of the results.
+"""
+
+_prompt_tail = """The 'summary' key should contain a human-readable summary of the results.
 If no products are found, return a JSON object with an empty 'products' list and a summary indicating that no products were found."""
 
-model = ChatOpenAI(model="gpt-4")
-abot = Agent(model, system=prompt)
\ No newline at end of file
+prompt = _prompt_head + (_prompt_refs if COMPACT_TOOL_RESULTS else _prompt_records) + _prompt_tail
+
+_agent = None
+_agent_lock = threading.Lock()
+
+
+def get_agent() -> Agent:
+    """
+    Returns the agent, building it and its model client on first use.
+    """
+    global _agent
+    if _agent is None:
+        with _agent_lock:
+            if _agent is None:
+                _agent = Agent(chat_model("agent", model="gpt-4"), system=prompt)
+    return _agent
+
+
+def reset_agent():
+    # The next get_agent() builds a new agent around the current "agent" chat model
+    global _agent
+    with _agent_lock:
+        _agent = None
@@ -0,0 +1,38 @@
+"""
+Builds a columnar catalog snapshot from the product CSV.
+
+    python -m product_search.build_snapshot [--csv CSVs/noname_products.csv] [--out /app/snapshot]
+
+The server memory-maps the snapshot at startup instead of parsing the CSV,
+as long as the snapshot was built from the CSV's current contents. Running
+servers switch to the new snapshot on their next reload check.
+"""
+import os
+import time
+import argparse
+from .catalog import CSV_PATH, SNAPSHOT_DIR, load_catalog
+from .snapshot import build_lock, prune_snapshots, write_snapshot
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--csv", default=CSV_PATH, help="Product CSV to convert")
+    parser.add_argument("--out", default=SNAPSHOT_DIR, help="Snapshot directory")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.csv):
+        raise SystemExit(f"CSV file not found at: {args.csv}")
+
+    start = time.perf_counter()
+    # Take the build lock so a running server does not publish a snapshot at the same time
+    with build_lock(args.out):
+        catalog = load_catalog(args.csv)
+        directory = write_snapshot(catalog, args.out)
+        prune_snapshots(args.out)
+    size = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+    print(f"Wrote snapshot {catalog.version} ({len(catalog)} rows, {size / 1e6:.1f} MB) to {directory} "
+          f"in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+import os
+import json
+import time
+import inspect
+import sqlite3
+import functools
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict
+from .results import ProductResults
+from .metrics import cache_lookup_seconds, search_seconds, span
+
+# "memory" keeps caches in-process; "sqlite" persists them under CACHE_DIR so they survive restarts
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+CACHE_DIR = os.getenv("CACHE_DIR", "/tmp/noname-mcp-cache")
+
+MISSING = object()
+
+
+class LRUCache:
+    """
+    Thread-safe in-memory LRU cache whose entries expire after `ttl` seconds.
+    """
+
+    def __init__(self, name: str, maxsize: int = 1024, ttl: float = 300):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key: str, default: Any = MISSING) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+                self.expirations += 1
+            self.misses += 1
+            return default
+
+    def set(self, key: str, value: Any):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        return {
+            "backend": "memory",
+            "size": len(self),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class SQLiteCache(LRUCache):
+    """
+    LRU + TTL cache persisted in a SQLite file. Values must be strings.
+    """
+
+    RECOUNT_INTERVAL = 1000
+
+    def __init__(self, name: str, maxsize: int = 1024, ttl: float = 300, path: str = None):
+        super().__init__(name, maxsize, ttl)
+        self.path = path or os.path.join(CACHE_DIR, f"{name}.sqlite3")
+        # Opened on first use, so creating a cache (e.g. at import) never touches the disk
+        self._conn = None
+        # Running row count, so writes do not scan the table; other processes sharing
+        # the file make it drift, so it is recounted every RECOUNT_INTERVAL inserts
+        self._size = 0
+        self._inserts = 0
+
+    def _db(self) -> sqlite3.Connection:
+        # Called with the lock held
+        if self._conn is None:
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+                conn.execute("PRAGMA journal_mode=WAL")
+            except (OSError, sqlite3.Error) as e:
+                # An unwritable cache directory costs persistence, not the feature
+                print(f"Cache {self.name} cannot open {self.path}, keeping it in memory: {e}")
+                conn = sqlite3.connect(":memory:", check_same_thread=False, isolation_level=None)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)")
+            self._conn = conn
+            self._size = self._count()
+        return self._conn
+
+    def _count(self) -> int:
+        return self._db().execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+    def __len__(self):
+        # 0 until the file is first used, so stats never open it
+        with self._lock:
+            return self._size
+
+    def get(self, key: str, default: Any = MISSING) -> Any:
+        # Wall-clock time, since entries outlive the process
+        now = time.time()
+        with self._lock:
+            row = self._db().execute("SELECT value, expires FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                value, expires = row
+                if expires > now:
+                    self._db().execute("UPDATE cache SET accessed = ? WHERE key = ?", (now, key))
+                    self.hits += 1
+                    return value
+                self._size -= self._db().execute("DELETE FROM cache WHERE key = ?", (key,)).rowcount
+                self.expirations += 1
+            self.misses += 1
+            return default
+
+    def set(self, key: str, value: str):
+        now = time.time()
+        with self._lock:
+            updated = self._db().execute(
+                "UPDATE cache SET value = ?, expires = ?, accessed = ? WHERE key = ?",
+                (value, now + self.ttl, now, key),
+            ).rowcount
+            if updated:
+                return
+            self._db().execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires, accessed) VALUES (?, ?, ?, ?)",
+                (key, value, now + self.ttl, now),
+            )
+            self._size += 1
+            self._inserts += 1
+            if self._inserts % self.RECOUNT_INTERVAL == 0:
+                self._size = self._count()
+            if self._size > self.maxsize:
+                evicted = self._db().execute(
+                    "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY accessed LIMIT ?)",
+                    (self._size - self.maxsize,),
+                ).rowcount
+                self._size -= evicted
+                self.evictions += evicted
+
+    def clear(self):
+        with self._lock:
+            self._db().execute("DELETE FROM cache")
+            self._size = 0
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats["backend"] = "sqlite"
+        return stats
+
+
+class TieredCache:
+    """
+    A bounded in-memory LRU in front of a persistent store. Reads fall through
+    to the store and promote hits into memory; writes go to both.
+    """
+
+    def __init__(self, name: str, memory: LRUCache, store: LRUCache):
+        self.name = name
+        self.memory = memory
+        self.store = store
+
+    def __len__(self):
+        return len(self.store)
+
+    def get(self, key: str, default: Any = MISSING) -> Any:
+        value = self.memory.get(key)
+        if value is MISSING:
+            value = self.store.get(key)
+            if value is MISSING:
+                return default
+            self.memory.set(key, value)
+        return value
+
+    def set(self, key: str, value: str):
+        self.memory.set(key, value)
+        self.store.set(key, value)
+
+    def clear(self):
+        self.memory.clear()
+        self.store.clear()
+
+    def stats(self) -> dict:
+        return {"backend": "tiered", "memory": self.memory.stats(), "store": self.store.stats()}
+
+
+# Every cache created through make_cache, by name, for reporting
+caches: Dict[str, LRUCache] = {}
+
+
+def make_cache(name: str, maxsize: int, ttl: float, backend: str = None) -> LRUCache:
+    """
+    Creates a cache with the configured backend and registers it for stats.
+    """
+    backend = backend or CACHE_BACKEND
+    if backend == "sqlite":
+        cache = SQLiteCache(name, maxsize=maxsize, ttl=ttl)
+    elif backend == "memory":
+        cache = LRUCache(name, maxsize=maxsize, ttl=ttl)
+    else:
+        raise ValueError(f"Unknown cache backend: {backend}")
+    caches[name] = cache
+    return cache
+
+
+def make_tiered_cache(name: str, maxsize: int, ttl: float, store_maxsize: int, backend: str = None) -> LRUCache:
+    """
+    Creates a memory-bounded cache backed by a SQLite store and registers it
+    for stats. With the "memory" backend there is no store, only the LRU.
+    """
+    backend = backend or CACHE_BACKEND
+    if backend == "memory":
+        return make_cache(name, maxsize=maxsize, ttl=ttl, backend="memory")
+    if backend != "sqlite":
+        raise ValueError(f"Unknown cache backend: {backend}")
+    cache = TieredCache(
+        name,
+        memory=LRUCache(f"{name}_memory", maxsize=maxsize, ttl=ttl),
+        store=SQLiteCache(f"{name}_store", maxsize=store_maxsize, ttl=ttl),
+    )
+    caches[name] = cache
+    return cache
+
+
+def cache_stats() -> dict:
+    return {name: cache.stats() for name, cache in caches.items()}
+
+
+def make_key(*parts: Any) -> str:
+    return json.dumps(parts, separators=(",", ":"), default=str)
+
+
+tool_cache = make_cache(
+    "tool_results",
+    maxsize=int(os.getenv("TOOL_CACHE_SIZE", "4096")),
+    ttl=float(os.getenv("TOOL_CACHE_TTL", "3600")),
+)
+
+
+def cached_results(fn: Callable[..., ProductResults]) -> Callable[..., ProductResults]:
+    """
+    Caches a catalog search's ProductResults on its exact arguments.
+
+    Only the row ids are stored, so entries are small and work with any
+    backend. The catalog version is part of the key, so a reload invalidates
+    every entry without having to flush the cache. The wrapped function is
+    called with the same `catalog` the key was built from.
+    """
+    signature = inspect.signature(fn)
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with span(fn.__name__, search_seconds, search=fn.__name__) as search:
+            # Imported here so importing the cache (and the tools) does not load the catalog modules
+            from .catalog import get_catalog
+            catalog = get_catalog()
+            # Bind to the signature so positional, keyword and defaulted calls share a key
+            bound = signature.bind(*args, catalog=catalog, **kwargs)
+            bound.apply_defaults()
+            # Exact values: searches are case- and whitespace-sensitive, and cursors are opaque
+            arguments = {name: value for name, value in bound.arguments.items() if name != "catalog"}
+            key = make_key(fn.__name__, catalog.version, arguments)
+            with span("cache_lookup", cache_lookup_seconds, cache="tool"):
+                cached = tool_cache.get(key)
+            # The arguments go on the span, so slow-request logs show what was searched
+            search.set(arguments={name: value for name, value in arguments.items() if value is not None},
+                       cache_hit=cached is not MISSING)
+            if cached is not MISSING:
+                return ProductResults.from_cache(catalog, cached)
+            results = fn(*bound.args, **bound.kwargs)
+            tool_cache.set(key, results.to_cache())
+            return results
+    return wrapper
@@ -0,0 +1,355 @@
+import os
+import copy
+import hashlib
+import threading
+import orjson
+import numpy as np
+import pandas as pd
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional
+from .filters import FilterEngine, unit_prices
+from .index import NameIndex
+from .metrics import catalog_load_seconds, span
+from .results import ROW_FIELDS
+
+if TYPE_CHECKING:
+    from .similarity import SimilarityEngine
+
+# Location of the product CSV; overridable so the server can run outside the container
+CSV_PATH = os.getenv("PRODUCT_CSV_PATH", "/app/CSVs/noname_products.csv")
+
+# Directory of prebuilt catalog snapshots (see product_search.build_snapshot); used when up to date
+SNAPSHOT_DIR = os.getenv("PRODUCT_SNAPSHOT_DIR", "/app/snapshot")
+
+# How often (in seconds) the background watcher checks the CSV for changes
+RELOAD_INTERVAL = float(os.getenv("CATALOG_RELOAD_INTERVAL", "5"))
+
+PRODUCT_LINK_TEMPLATE = "https://www.realcanadiansuperstore.ca/p/{code}"
+
+# Hashed into every catalog version; bump it when the catalog built from the same CSV changes,
+# so snapshots and cached results keyed on the version are not reused
+CATALOG_LAYOUT = 4
+
+COLUMNS = ROW_FIELDS + ["product_link"]
+
+INT_COLUMNS = ["date", "store_id"]
+FLOAT_COLUMNS = ["price"]
+STRING_COLUMNS = ["code", "article_number", "name", "aisle", "brand", "package_size", "unit", "sale_type"]
+
+# Columns derived from the CSV at load, held like the CSV columns
+NUMERIC_COLUMNS = INT_COLUMNS + FLOAT_COLUMNS + ["unit_price"]
+CATEGORY_COLUMNS = STRING_COLUMNS + ["unit_price_basis"]
+
+
+def normalize_column(col: str) -> str:
+    """
+    Converts a CSV header such as 'Store ID' into a valid Python identifier ('store_id').
+    """
+    return col.strip().lower().replace(' ', '_').replace('-', '_')
+
+
+def file_digest(path: str) -> str:
+    """
+    Returns a short content hash of the file, used as the catalog version.
+    """
+    h = hashlib.sha256(f"layout {CATALOG_LAYOUT}\n".encode())
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()[:16]
+
+
+class CategoryColumn:
+    """
+    A dictionary-encoded string column: one integer code per row plus the
+    distinct values. Indexing by row returns the value, so it stands in for an
+    array of strings without holding a Python object per row, and the codes
+    can be memory-mapped straight from a snapshot.
+    """
+
+    __slots__ = ("codes", "values")
+
+    def __init__(self, codes: np.ndarray, values: List[str]):
+        self.codes = codes
+        self.values = values
+
+    @classmethod
+    def encode(cls, values: Iterable) -> "CategoryColumn":
+        codes, uniques = pd.factorize(np.asarray(values, dtype=object), sort=True)
+        return cls(codes.astype(np.int32), list(uniques))
+
+    def __getitem__(self, row: int):
+        return self.values[self.codes[row]]
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __iter__(self):
+        values = self.values
+        return (values[code] for code in self.codes.tolist())
+
+    def to_categorical(self) -> pd.Categorical:
+        if None in self.values:
+            # Categories cannot be null, so a None value becomes a missing entry
+            return pd.Categorical(np.asarray(self.values, dtype=object)[np.asarray(self.codes)])
+        return pd.Categorical.from_codes(self.codes, self.values)
+
+
+def product_links(code: CategoryColumn) -> CategoryColumn:
+    """
+    The 'product_link' column, derived from the 'code' column and sharing
+    its codes. Products without a code ('') have no link (None).
+    """
+    return CategoryColumn(code.codes, [PRODUCT_LINK_TEMPLATE.format(code=value) if value else None
+                                       for value in code.values])
+
+
+def first_rows(column: CategoryColumn) -> np.ndarray:
+    """
+    The first row holding each distinct value of a CategoryColumn, indexed
+    by the value's code.
+    """
+    codes = np.asarray(column.codes)
+    rows = np.zeros(len(column.values), dtype=np.int64)
+    # Assigned last to first, so where a code repeats the earliest row is the one that sticks
+    rows[codes[::-1]] = np.arange(len(codes) - 1, -1, -1)
+    return rows
+
+
+class Catalog:
+    """
+    An immutable, fully-loaded snapshot of the product data.
+
+    The data is held column by column: numeric columns as arrays and string
+    columns (including the precomputed 'product_link') as CategoryColumns.
+    Names are stripped and field types enforced at load, so tools can serve
+    rows without further cleanup. A Catalog is never mutated after
+    construction; reloads build a new instance. The name search index,
+    similarity engine, filter engine and first row of each product code are
+    built alongside the columns so all are swapped together.
+    """
+
+    def __init__(self, columns: Dict[str, Any], version: str, path: str = None, mtime: float = None,
+                 index: NameIndex = None, similarity: "SimilarityEngine" = None, filters: FilterEngine = None):
+        self.columns = columns
+        self.version = version
+        self.path = path
+        self.mtime = mtime
+        self.index = index if index is not None else NameIndex(columns['name'])
+        if similarity is None:
+            # Imported here so importing the catalog does not load scipy before a catalog is built
+            from .similarity import SimilarityEngine
+            similarity = SimilarityEngine(self.index, columns['brand'], columns['aisle'], columns['price'])
+        self.similarity = similarity
+        self.filters = filters if filters is not None else FilterEngine(columns, self.index)
+        self.links = columns['product_link']
+        self.code_rows = first_rows(columns['code'])
+
+    @classmethod
+    def from_frame(cls, frame: pd.DataFrame, version: str, path: str = None, mtime: float = None) -> "Catalog":
+        """
+        Builds a catalog from a frame in the layout produced by build_frame().
+        """
+        columns = {}
+        for col in ROW_FIELDS:
+            if col in NUMERIC_COLUMNS:
+                columns[col] = frame[col].to_numpy()
+            else:
+                columns[col] = CategoryColumn.encode(frame[col])
+        columns['product_link'] = product_links(columns['code'])
+        return cls(columns, version=version, path=path, mtime=mtime)
+
+    def row_fragment(self, row: int) -> bytes:
+        """
+        Returns the row's catalog fields as JSON, without the closing brace.
+        Encoded from the columns on each call rather than kept per row, so
+        workers sharing a memory-mapped snapshot do not each build a copy.
+        """
+        record = {field: self.columns[field][row] for field in ROW_FIELDS}
+        return orjson.dumps(record, option=orjson.OPT_SERIALIZE_NUMPY)[:-1]
+
+    def __len__(self):
+        return len(self.columns['date'])
+
+    @classmethod
+    def empty(cls) -> "Catalog":
+        return cls.from_frame(build_frame(pd.DataFrame(columns=INT_COLUMNS + FLOAT_COLUMNS + STRING_COLUMNS)), version="empty")
+
+
+def build_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Normalizes a raw product DataFrame into the catalog layout.
+    """
+    df = df.copy()
+    df.columns = [normalize_column(col) for col in df.columns]
+
+    # Enforce the Product field types once here, so rows can be served without per-request validation
+    for col in INT_COLUMNS:
+        df[col] = df[col].astype('int64')
+    for col in FLOAT_COLUMNS:
+        df[col] = df[col].astype('float64')
+    for col in STRING_COLUMNS:
+        df[col] = df[col].fillna('').astype(str)
+    df['name'] = df['name'].str.strip()
+
+    # The CSV may hold several days of prices: list each product's latest row per store, which also
+    # drops rows repeated verbatim. The full history is served by the price store (prices.py).
+    df = df.sort_values('date', kind='stable').drop_duplicates(['code', 'store_id'], keep='last').sort_index()
+
+    # Normalized price per 100 g / 100 ml / 1 ea, for filtering and sorting across package sizes
+    df['unit_price'], df['unit_price_basis'] = unit_prices(df['package_size'], df['price'])
+
+    # Precompute the product link once instead of per request; codes are '' where the CSV had none
+    df['product_link'] = [PRODUCT_LINK_TEMPLATE.format(code=code) if code else None for code in df['code']]
+
+    return df.reset_index(drop=True)
+
+
+def load_catalog(path: str = CSV_PATH, snapshot_dir: str = None) -> Catalog:
+    """
+    Loads the catalog from an up-to-date snapshot in `snapshot_dir` if there
+    is one, and otherwise parses the product CSV.
+    """
+    if snapshot_dir:
+        # Imported here because the snapshot module builds on this one
+        from .snapshot import load_current_snapshot
+        catalog = load_current_snapshot(path, snapshot_dir)
+        if catalog is not None:
+            return catalog
+
+    if not os.path.exists(path):
+        print(f"CSV file not found at: {path}")
+        return Catalog.empty()
+
+    with span("load_csv", catalog_load_seconds, source="csv"):
+        mtime = os.path.getmtime(path)
+        version = file_digest(path)
+        df = pd.read_csv(path, dtype={'Article Number': str, 'Code': str})
+        frame = build_frame(df)
+        print(f"Loaded {len(frame)} products from CSV (version {version})")
+        return Catalog.from_frame(frame, version=version, path=path, mtime=mtime)
+
+
+class CatalogManager:
+    """
+    Owns the current Catalog and swaps it for a new one when the data changes.
+
+    Readers call get() and keep using the instance they received; a reload
+    builds the replacement off to the side and publishes it with a single
+    reference assignment, so in-flight requests never see a half-loaded catalog.
+
+    With a snapshot directory, every worker process attaches the same
+    memory-mapped snapshot and the directory's CURRENT pointer decides which
+    version is live. When the CSV changes, whichever worker takes the build
+    lock first publishes the new snapshot and flips the pointer. The builder
+    switches right away and the other workers when their watchers next see the
+    pointer move, so all workers flip within one reload interval of each other.
+    """
+
+    def __init__(self, path: str = CSV_PATH, interval: float = RELOAD_INTERVAL, snapshot_dir: str = SNAPSHOT_DIR):
+        self.path = path
+        self.interval = interval
+        self.snapshot_dir = snapshot_dir
+        self._catalog = None
+        self._lock = threading.Lock()
+        self._watcher = None
+        self._stop = threading.Event()
+
+    def get(self) -> Catalog:
+        catalog = self._catalog
+        if catalog is None:
+            with self._lock:
+                if self._catalog is None:
+                    self._catalog = self._load()
+                    self.start()
+                catalog = self._catalog
+        return catalog
+
+    def _load(self, wait: bool = True) -> Optional[Catalog]:
+        if self.snapshot_dir:
+            # Imported here because the snapshot module builds on this one
+            from .snapshot import attach_catalog
+            try:
+                return attach_catalog(self.path, self.snapshot_dir, wait=wait)
+            except OSError as e:
+                print(f"Snapshot directory {self.snapshot_dir} unavailable, loading the CSV in this process: {e}")
+        return load_catalog(self.path)
+
+    def _published(self, current: Catalog) -> Optional[Catalog]:
+        """
+        Returns the catalog another process published to the snapshot
+        directory, or None if the pointer still names the current version.
+        """
+        from .snapshot import current_version, load_snapshot
+        version = current_version(self.snapshot_dir)
+        if version is None or version == current.version:
+            return None
+        catalog = load_snapshot(os.path.join(self.snapshot_dir, version))
+        print(f"Switched to published snapshot {version}")
+        return catalog
+
+    def refresh(self) -> bool:
+        """
+        Switches to a newly published snapshot, or reloads the catalog if the
+        file's mtime and content hash changed. Returns True when a new catalog
+        was published.
+        """
+        with self._lock:
+            current = self._catalog
+            if current is not None and self.snapshot_dir and os.path.isdir(self.snapshot_dir):
+                try:
+                    published = self._published(current)
+                except Exception as e:
+                    print(f"Error attaching published snapshot, keeping version {current.version}: {e}")
+                    published = None
+                if published is not None:
+                    self._catalog = published
+                    return True
+
+            if not os.path.exists(self.path):
+                return False
+            mtime = os.path.getmtime(self.path)
+            if current is not None and current.mtime == mtime:
+                return False
+            if current is not None and current.version == file_digest(self.path):
+                # Touched but not modified; remember the mtime to skip rehashing next time
+                touched = copy.copy(current)
+                touched.mtime = mtime
+                self._catalog = touched
+                return False
+            try:
+                # Never wait on another worker's build; its pointer flip is picked up on a later check
+                new_catalog = self._load(wait=False)
+            except Exception as e:
+                print(f"Error reloading catalog, keeping version {current.version if current else None}: {e}")
+                return False
+            if new_catalog is None:
+                return False
+            self._catalog = new_catalog
+            return True
+
+    def start(self):
+        if self.interval <= 0 or (self._watcher is not None and self._watcher.is_alive()):
+            return
+        self._stop.clear()
+        self._watcher = threading.Thread(target=self._watch, name="catalog-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _watch(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Catalog watcher error: {e}")
+
+
+catalog_manager = CatalogManager()
+
+
+def get_catalog() -> Catalog:
+    """
+    Returns the current catalog, loading it on first use.
+    """
+    return catalog_manager.get()
@@ -0,0 +1,151 @@
+import os
+import time
+import asyncio
+import threading
+import concurrent.futures
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict
+
+# Maximum number of agent runs in flight per worker process
+MAX_CONCURRENCY = int(os.getenv("MCP_MAX_CONCURRENCY", "32"))
+
+# Maximum number of requests allowed to wait for a slot before new ones are rejected
+MAX_QUEUE = int(os.getenv("MCP_MAX_QUEUE", "64"))
+
+# Seconds a request may wait for a slot before it is rejected
+QUEUE_TIMEOUT = float(os.getenv("MCP_QUEUE_TIMEOUT", "30"))
+
+
+class LimiterRejected(Exception):
+    """
+    Raised when a request cannot get a slot; the endpoint turns it into a 429.
+    """
+
+
+class ConcurrencyLimiter:
+    """
+    Bounds the number of concurrent agent runs with a bounded wait queue.
+
+    Requests beyond `limit` wait for a slot; once `max_queue` requests are
+    already waiting, or a request has waited `queue_timeout` seconds, it is
+    rejected so clients get backpressure instead of unbounded latency.
+    """
+
+    def __init__(self, limit: int = MAX_CONCURRENCY, max_queue: int = MAX_QUEUE,
+                 queue_timeout: float = QUEUE_TIMEOUT):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        # Created on first use so it binds to the server's event loop, not the import-time one
+        self._semaphore = None
+
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.queue_wait_seconds_total = 0.0
+        self.queue_wait_seconds_max = 0.0
+
+    @asynccontextmanager
+    async def slot(self):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.limit)
+
+        start = time.perf_counter()
+        if not self._semaphore.locked():
+            # A permit is free, so this returns without suspending
+            await self._semaphore.acquire()
+        else:
+            if self.waiting >= self.max_queue:
+                self.rejected += 1
+                raise LimiterRejected("Too many requests queued, try again later")
+
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                raise LimiterRejected("Timed out waiting for a free slot, try again later")
+            finally:
+                self.waiting -= 1
+
+        waited = time.perf_counter() - start
+        self.queue_wait_seconds_total += waited
+        self.queue_wait_seconds_max = max(self.queue_wait_seconds_max, waited)
+        self.admitted += 1
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "queue_wait_seconds_total": round(self.queue_wait_seconds_total, 6),
+            "queue_wait_seconds_max": round(self.queue_wait_seconds_max, 6),
+        }
+
+
+agent_limiter = ConcurrencyLimiter()
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into one execution.
+
+    The first caller for a key runs the function; callers arriving while it is
+    in flight wait for and share its result (or exception). Threaded callers
+    use do() and async callers use ado(); the two do not share in-flight calls.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, concurrent.futures.Future] = {}
+        self._tasks: Dict[str, asyncio.Future] = {}
+        self.executed = 0
+        self.shared = 0
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = concurrent.futures.Future()
+                self.executed += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    async def ado(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._tasks.get(key)
+        if task is None:
+            task = self._tasks[key] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda _: self._tasks.pop(key, None))
+            self.executed += 1
+        else:
+            self.shared += 1
+        # Shield the shared call so one cancelled caller does not cancel it for the others
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        return {"executed": self.executed, "shared": self.shared, "in_flight": len(self._calls) + len(self._tasks)}
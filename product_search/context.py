@@ -0,0 +1,161 @@
+import os
+import json
+from typing import Any, Dict, List, Optional, Tuple
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
+
+# Send the model compact product tables instead of full product records (0 sends the tools' JSON as-is)
+COMPACT_TOOL_RESULTS = os.getenv("AGENT_COMPACT_TOOL_RESULTS", "1") != "0"
+
+# Agent steps whose tool results the model sees in full; older results are cut down to product refs and names
+FULL_TOOL_STEPS = int(os.getenv("AGENT_FULL_TOOL_STEPS", "1"))
+
+# Fields the model sees for each product: (column, field in the product record)
+COMPACT_FIELDS = [
+    ("name", "name"),
+    ("price", "price"),
+    ("size", "package_size"),
+    ("unit_price", "unit_price"),
+    ("store", "store_id"),
+    ("sale", "sale_type"),
+]
+
+
+def _products(payload: Any) -> Optional[List[dict]]:
+    """
+    The product records in a search tool's output: a page
+    ({"products": [...], "next_cursor": ...}) or a plain list of products.
+    """
+    products = payload.get("products") if isinstance(payload, dict) else payload
+    if not isinstance(products, list) or not products:
+        return None
+    if not all(isinstance(product, dict) and "name" in product and "price" in product for product in products):
+        return None
+    return products
+
+
+def _unit_price(product: dict) -> Optional[str]:
+    if product.get("unit_price") is None:
+        return None
+    return f"{product['unit_price']:g}/{product.get('unit_price_basis') or 'unit'}"
+
+
+def compact_tool_result(content: str, first_ref: int) -> Tuple[str, Optional[dict]]:
+    """
+    Turns a search tool's JSON output into a table for the model.
+
+    Each product gets a ref ("p1", "p2", ...) numbered from `first_ref`, so
+    refs stay unique across a run; the model answers with refs and the full
+    records are attached afterwards. Returns the table and an artifact
+    holding the refs and the original payload, or the content unchanged and
+    None when it is not a product list.
+    """
+    try:
+        payload = json.loads(content)
+    except (json.JSONDecodeError, TypeError):
+        return content, None
+    products = _products(payload)
+    if products is None:
+        return content, None
+
+    refs = [f"p{first_ref + i}" for i in range(len(products))]
+    columns = ["ref"] + [column for column, _ in COMPACT_FIELDS]
+    scored = any(product.get("match_score") is not None for product in products)
+    if scored:
+        columns.append("score")
+
+    rows = []
+    for ref, product in zip(refs, products):
+        row = [ref]
+        for column, field in COMPACT_FIELDS:
+            row.append(_unit_price(product) if field == "unit_price" else product.get(field))
+        if scored:
+            row.append(product.get("match_score"))
+        rows.append(row)
+
+    table = {"columns": columns, "rows": rows}
+    if isinstance(payload, dict) and payload.get("next_cursor"):
+        table["next_cursor"] = payload["next_cursor"]
+    return json.dumps(table, separators=(",", ":")), {"refs": refs, "payload": payload}
+
+
+def condensed_tool_result(message: ToolMessage) -> str:
+    # An older result: just the refs and names, enough to refer back to the products
+    refs = message.artifact["refs"]
+    products = _products(message.artifact["payload"])
+    rows = [[ref, product.get("name")] for ref, product in zip(refs, products)]
+    return json.dumps({"columns": ["ref", "name"], "rows": rows, "note": "earlier result, trimmed"},
+                      separators=(",", ":"))
+
+
+def has_products(message: BaseMessage) -> bool:
+    return isinstance(message, ToolMessage) and isinstance(getattr(message, "artifact", None), dict) \
+        and "refs" in message.artifact
+
+
+def next_ref(messages: List[BaseMessage]) -> int:
+    return 1 + sum(len(message.artifact["refs"]) for message in messages if has_products(message))
+
+
+def trim_tool_results(messages: List[BaseMessage], full_steps: int = FULL_TOOL_STEPS) -> List[BaseMessage]:
+    """
+    Returns the messages to send the model: product results from the last
+    `full_steps` tool steps as they are, older ones condensed. The agent
+    state itself is left untouched, so every full record stays available.
+    """
+    steps = [i for i, message in enumerate(messages) if isinstance(message, AIMessage) and message.tool_calls]
+    if len(steps) <= full_steps:
+        return messages
+    cutoff = steps[-full_steps] if full_steps > 0 else len(messages)
+    return [
+        ToolMessage(content=condensed_tool_result(message), name=message.name, tool_call_id=message.tool_call_id)
+        if i < cutoff and has_products(message) else message
+        for i, message in enumerate(messages)
+    ]
+
+
+def products_by_ref(messages: List[BaseMessage]) -> Dict[str, dict]:
+    """
+    The full product records behind every ref shown to the model.
+    """
+    products = {}
+    for message in messages:
+        if has_products(message):
+            products.update(zip(message.artifact["refs"], _products(message.artifact["payload"])))
+    return products
+
+
+def attach_products(data: dict, products: Dict[str, dict]) -> dict:
+    """
+    Replaces product refs in the model's answer with the full records. Refs
+    may be given as strings or as objects with a "ref" key; unknown refs are
+    dropped, and records the model wrote out itself are kept.
+    """
+    for key in ("products", "similar_products"):
+        items = data.get(key)
+        if not isinstance(items, list):
+            continue
+        resolved = []
+        for item in items:
+            ref = item.get("ref") if isinstance(item, dict) else item
+            if isinstance(ref, str) and ref in products:
+                resolved.append(products[ref])
+            elif isinstance(item, dict) and "ref" not in item:
+                resolved.append(item)
+        data[key] = resolved
+    return data
+
+
+def token_usage(message: AIMessage, prompt: list) -> int:
+    """
+    Tokens used by one model call as reported by the API, or an estimate of
+    about four characters per token when the response carries no usage.
+    """
+    usage = getattr(message, "usage_metadata", None)
+    if usage and usage.get("total_tokens"):
+        return usage["total_tokens"]
+    usage = (message.response_metadata or {}).get("token_usage") or {}
+    if usage.get("total_tokens"):
+        return usage["total_tokens"]
+    text = "".join(str(getattr(item, "content", item)) for item in prompt) + str(message.content)
+    return len(text) // 4
+
@@ -0,0 +1,243 @@
+import re
+import numpy as np
+import pandas as pd
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Package sizes look like "500 g", "1.75 l", "12 eggs" or "24x120.0 ml" (count x amount)
+PACKAGE_SIZE_RE = re.compile(r"^\s*(?:(\d+(?:\.\d+)?)\s*x\s*)?(\d+(?:\.\d+)?)\s*([a-z]+)\s*$", re.IGNORECASE)
+
+# Package units mapped to a base measure and the factor converting them into it
+UNIT_FACTORS = {
+    "g": ("g", 1.0), "kg": ("g", 1000.0),
+    "ml": ("ml", 1.0), "l": ("ml", 1000.0),
+    "ea": ("ea", 1.0), "eggs": ("ea", 1.0), "pack": ("ea", 1.0),
+}
+
+# Quantity of the base measure that unit prices are quoted for
+UNIT_PRICE_BASIS = {"g": (100.0, "100 g"), "ml": (100.0, "100 ml"), "ea": (1.0, "1 ea")}
+
+# Columns with a sorted index, usable for sort_by and range filters
+SORT_KEYS = ("price", "unit_price")
+
+
+def parse_package_size(text: str) -> Tuple[float, str]:
+    """
+    Parses a package size into its total quantity in a base measure
+    ("g", "ml" or "ea"), e.g. "24x120.0 ml" -> (2880.0, "ml").
+    Returns (nan, "") if the size is not understood.
+    """
+    match = PACKAGE_SIZE_RE.match(text or "")
+    if not match:
+        return float("nan"), ""
+    count, amount, unit = match.groups()
+    measure = UNIT_FACTORS.get(unit.lower())
+    if measure is None:
+        return float("nan"), ""
+    base, factor = measure
+    return float(count or 1) * float(amount) * factor, base
+
+
+def unit_prices(package_sizes: pd.Series, prices: pd.Series) -> Tuple[np.ndarray, List[str]]:
+    """
+    Returns each row's price per basis quantity (e.g. per 100 g) and the
+    basis label, with nan and "" where the package size is not understood.
+    Package sizes repeat heavily, so each distinct size is parsed once.
+    """
+    codes, sizes = pd.factorize(package_sizes.astype(str))
+    quantities = np.empty(len(sizes) + 1)
+    labels = []
+    for i, size in enumerate(sizes):
+        quantity, measure = parse_package_size(size)
+        basis, label = UNIT_PRICE_BASIS.get(measure, (float("nan"), ""))
+        quantities[i] = quantity / basis if quantity > 0 else float("nan")
+        labels.append(label)
+    quantities[-1] = float("nan")
+    labels.append("")
+
+    # Code -1 (a missing size) picks the trailing nan entry
+    quantities = quantities[codes]
+    with np.errstate(invalid="ignore"):
+        values = np.round(np.asarray(prices, dtype=np.float64) / quantities, 4)
+    return values, [labels[code] for code in codes]
+
+
+class SortedIndex:
+    """
+    Row ids ordered by a numeric column, with the sorted values alongside.
+
+    Rows whose value is nan are left out. Range lookups are two binary
+    searches returning a slice of the row order, so range and top-k queries
+    never scan or sort the column per query.
+    """
+
+    def __init__(self, order: np.ndarray, values: np.ndarray):
+        self.order = order
+        self.values = values
+
+    @classmethod
+    def build(cls, column) -> "SortedIndex":
+        column = np.asarray(column, dtype=np.float64)
+        rows = np.flatnonzero(~np.isnan(column))
+        # A stable sort keeps equal values in row order, so results are deterministic
+        order = rows[np.argsort(column[rows], kind="stable")].astype(np.int32)
+        return cls(order, column[order])
+
+    def __len__(self):
+        return len(self.order)
+
+    def range(self, low: Optional[float] = None, high: Optional[float] = None) -> np.ndarray:
+        """
+        Returns the rows with low <= value <= high, in ascending value order.
+        """
+        start = 0 if low is None else np.searchsorted(self.values, low, side="left")
+        end = len(self.values) if high is None else np.searchsorted(self.values, high, side="right")
+        return self.order[start:end]
+
+
+class FilterEngine:
+    """
+    Structured product queries: name match, price and unit price ranges,
+    brand / aisle / sale type filters, sorted by price or unit price.
+
+    Without a name query, the sorted index of the sort key supplies rows
+    already in order and restricted to its range; the other filters are
+    applied to it chunk by chunk until `limit` rows pass, so top-k queries
+    touch only as many rows as they need. When a range on the other key is
+    much narrower, or with a name query, the smaller candidate set is
+    filtered instead and the top `limit` picked with a partial sort.
+    """
+
+    def __init__(self, columns: Dict, index, sorted_indexes: Dict[str, SortedIndex] = None):
+        self.columns = columns
+        self.index = index
+        if sorted_indexes is None:
+            sorted_indexes = {key: SortedIndex.build(columns[key]) for key in SORT_KEYS}
+        self.sorted = sorted_indexes
+
+    def _codes_matching(self, column: str, text: str) -> np.ndarray:
+        """
+        Codes of the column's distinct values containing the text, case-insensitively.
+        """
+        text = text.strip().lower()
+        values = self.columns[column].values
+        return np.asarray([code for code, value in enumerate(values) if text in value.lower()], dtype=np.int32)
+
+    def _predicates(self, ranges: Dict[str, Tuple[Optional[float], Optional[float]]],
+                    categories: Dict[str, str]) -> Optional[List[Callable[[np.ndarray], np.ndarray]]]:
+        """
+        Builds one vectorized row filter per constraint, or returns None if a
+        category filter matches no value at all.
+        """
+        predicates = []
+        for key, (low, high) in ranges.items():
+            column = self.columns[key]
+            if low is not None:
+                predicates.append(lambda rows, column=column, low=low: column[rows] >= low)
+            if high is not None:
+                predicates.append(lambda rows, column=column, high=high: column[rows] <= high)
+        for key, text in categories.items():
+            codes = self._codes_matching(key, text)
+            if len(codes) == 0:
+                return None
+            column = self.columns[key].codes
+            predicates.append(lambda rows, column=column, codes=codes: np.isin(column[rows], codes))
+        return predicates
+
+    def search(self, query: Optional[str] = None, min_price: Optional[float] = None, max_price: Optional[float] = None,
+               min_unit_price: Optional[float] = None, max_unit_price: Optional[float] = None,
+               brand: Optional[str] = None, aisle: Optional[str] = None, sale_type: Optional[str] = None,
+               unit: Optional[str] = None, sort_by: Optional[str] = None, descending: bool = False,
+               limit: int = 10) -> List[int]:
+        """
+        Returns up to `limit` matching rows in result order.
+
+        Without a sort_by, name matches keep catalog order and queries without
+        a name are sorted by price. Sorting by unit price, or filtering on it,
+        leaves out products whose package size is not understood. `unit`
+        ("g", "kg", "ml", "l" or "ea") keeps products sold by weight, volume
+        or count, so their unit prices are comparable.
+        """
+        if sort_by is not None and sort_by not in SORT_KEYS:
+            raise ValueError(f"sort_by must be one of {', '.join(SORT_KEYS)}")
+        if limit <= 0:
+            return []
+
+        ranges = {"price": (min_price, max_price), "unit_price": (min_unit_price, max_unit_price)}
+        ranges = {key: bounds for key, bounds in ranges.items() if bounds != (None, None)}
+        categories = {"brand": brand, "aisle": aisle, "sale_type": sale_type}
+        categories = {key: text for key, text in categories.items() if text and text.strip()}
+
+        if unit:
+            measure = UNIT_FACTORS.get(unit.strip().lower())
+            if measure is None:
+                return []
+            categories["unit_price_basis"] = UNIT_PRICE_BASIS[measure[0]][1]
+
+        if query and query.strip():
+            predicates = self._predicates(ranges, categories)
+            if predicates is None:
+                return []
+            rows = np.asarray(self.index.search(query.strip().lower(), limit=None), dtype=np.int64)
+            return self._top(rows, predicates, sort_by, descending, limit)
+
+        sort_by = sort_by or "price"
+        # Each range is answered by its sorted index with two binary searches
+        slices = {key: self.sorted[key].range(*bounds) for key, bounds in ranges.items()}
+        if sort_by not in slices:
+            slices[sort_by] = self.sorted[sort_by].order
+        driver = min(slices, key=lambda key: len(slices[key]))
+        if driver != sort_by and len(slices[driver]) * 4 < len(slices[sort_by]):
+            # Another range is much narrower than the sort key's: filter it and partially sort the survivors
+            predicates = self._predicates({key: bounds for key, bounds in ranges.items() if key != driver}, categories)
+            if predicates is None:
+                return []
+            return self._top(np.asarray(slices[driver], dtype=np.int64), predicates, sort_by, descending, limit)
+
+        predicates = self._predicates({key: bounds for key, bounds in ranges.items() if key != sort_by}, categories)
+        if predicates is None:
+            return []
+        rows = slices[sort_by]
+        if descending:
+            rows = rows[::-1]
+
+        result = []
+        chunk = max(limit * 4, 256)
+        start = 0
+        while start < len(rows) and len(result) < limit:
+            block = rows[start:start + chunk]
+            mask = np.ones(len(block), dtype=bool)
+            for predicate in predicates:
+                mask &= predicate(block)
+            result.extend(block[mask][:limit - len(result)].tolist())
+            start += chunk
+            chunk *= 2
+        return result
+
+    def _top(self, rows: np.ndarray, predicates, sort_by: Optional[str], descending: bool, limit: int) -> List[int]:
+        """
+        Filters candidate rows and returns the first `limit` of them, in
+        catalog order or by the sort key.
+        """
+        if len(rows) == 0:
+            return []
+        mask = np.ones(len(rows), dtype=bool)
+        for predicate in predicates:
+            mask &= predicate(rows)
+        rows = rows[mask]
+
+        if sort_by is None:
+            return rows[:limit].tolist()
+
+        values = np.asarray(self.columns[sort_by][rows], dtype=np.float64)
+        keep = ~np.isnan(values)
+        rows, values = rows[keep], values[keep]
+        if descending:
+            values = -values
+        if len(rows) > limit:
+            # Partial selection: keep everything up to the k-th value (ties included), then order those
+            kth = np.partition(values, limit - 1)[limit - 1]
+            keep = values <= kth
+            rows, values = rows[keep], values[keep]
+        # Ties are broken by row id in the same direction as the sorted index walk
+        order = np.lexsort((-rows if descending else rows, values))[:limit]
+        return rows[order].tolist()
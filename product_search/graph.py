@@ -1,60 +1,123 @@
 import json
+import asyncio
+from typing import Literal, Optional
 from langchain_core.tools import tool
-from .tools import get_products, get_similar_products, get_recipe, get_nutritional_info, get_products_with_links, get_similar_products_with_links
+from .pagination import CursorError
+from .tools import (search_products, search_products_filtered, search_products_fuzzy, search_similar_products, aget_recipe,
+                    get_nutritional_info, get_latest_price, get_cheapest_stores, get_price_history)
+
+# The tools are async so the agent never blocks the event loop. Catalog lookups
+# are CPU-bound and run in the default thread pool; the recipe LLM call is awaited.
+# Searches return structured ProductResults, so emptiness is checked without re-parsing JSON.
 
 # Define the tools for the agent
 @tool
-def product_search(query: str) -> str:
-    """Searches for products and returns them as a JSON string."""
-    products_json = get_products(query)
-    products = json.loads(products_json)
-    if not products:
+async def product_search(query: str, cursor: Optional[str] = None) -> str:
+    """Searches for products and returns one page of them as a JSON string with a next_cursor. Pass next_cursor back as `cursor` for more results."""
+    try:
+        results = await asyncio.to_thread(search_products, query, cursor=cursor)
+    except CursorError as e:
+        return json.dumps({"response": str(e)})
+    if results.empty:
+        return json.dumps({"response": "No products found."})
+    return results.page_json()
+
+@tool
+async def fuzzy_product_search(query: str, score_cutoff: int = 75) -> str:
+    """Typo-tolerant product search for misspelled queries. Returns products ranked by match score (0-100) as a JSON string. Lower score_cutoff to loosen matching."""
+    results = await asyncio.to_thread(search_products_fuzzy, query, score_cutoff)
+    if results.empty:
+        return json.dumps({"response": "No products found."})
+    return results.json()
+
+@tool
+async def filtered_product_search(query: Optional[str] = None, min_price: Optional[float] = None,
+                                  max_price: Optional[float] = None, min_unit_price: Optional[float] = None,
+                                  max_unit_price: Optional[float] = None, brand: Optional[str] = None,
+                                  aisle: Optional[str] = None, sale_type: Optional[str] = None,
+                                  unit: Optional[Literal["g", "kg", "ml", "l", "ea"]] = None,
+                                  sort_by: Optional[str] = None, descending: bool = False,
+                                  with_links: bool = False) -> str:
+    """Finds products by price range, unit price, brand, aisle (e.g. Dairy) and sale type (REGULAR or SPECIAL), optionally containing `query` in the name. sort_by is 'price' or 'unit_price' (price per 100 g, 100 ml or 1 ea); min_unit_price / max_unit_price bound the unit price; set unit to 'g', 'kg', 'ml', 'l' or 'ea' so unit prices are comparable. Returns products as a JSON string."""
+    results = await asyncio.to_thread(
+        search_products_filtered, query, min_price=min_price, max_price=max_price, min_unit_price=min_unit_price,
+        max_unit_price=max_unit_price, brand=brand, aisle=aisle, sale_type=sale_type, unit=unit, sort_by=sort_by,
+        descending=descending, with_links=with_links,
+    )
+    if results.empty:
         return json.dumps({"response": "No products found."})
-    return products_json
+    return results.json()
+
+@tool
+async def latest_price_lookup(product: str, store_id: int) -> str:
+    """Returns the most recent price of a product (name or code) at a store as a JSON string."""
+    return await asyncio.to_thread(get_latest_price, product, store_id)
+
+@tool
+async def cheapest_store_finder(product: str, as_of: Optional[int] = None) -> str:
+    """Finds the stores with the lowest current price for a product (name or code). as_of (YYYYMMDD) uses each store's price on that date. Returns a JSON string."""
+    return await asyncio.to_thread(get_cheapest_stores, product, as_of)
+
+@tool
+async def price_history_lookup(product: str, store_id: Optional[int] = None, start: Optional[int] = None,
+                               end: Optional[int] = None) -> str:
+    """Returns a product's price history between start and end (YYYYMMDD, inclusive), optionally at one store, with the min, max and mean price over the range, as a JSON string."""
+    return await asyncio.to_thread(get_price_history, product, store_id, start, end)
 
 @tool
-def similar_products_search(product_name: str) -> str:
-    """Searches for similar products and returns them as a JSON string."""
-    products_json = get_similar_products(product_name)
-    products = json.loads(products_json)
-    if not products:
+async def similar_products_search(product_name: str, cursor: Optional[str] = None) -> str:
+    """Searches for similar products and returns one page of them as a JSON string with a next_cursor. Pass next_cursor back as `cursor` for more results."""
+    try:
+        results = await asyncio.to_thread(search_similar_products, product_name, cursor=cursor)
+    except CursorError as e:
+        return json.dumps({"response": str(e)})
+    if results.empty:
         return json.dumps({"response": "No similar products found."})
-    return products_json
+    return results.page_json()
 
 @tool
-def product_search_with_links(query: str) -> str:
-    """Searches for products and returns them with a web link as a JSON string."""
-    products_json = get_products_with_links(query)
-    products = json.loads(products_json)
-    if not products:
+async def product_search_with_links(query: str, cursor: Optional[str] = None) -> str:
+    """Searches for products and returns one page of them with a web link as a JSON string with a next_cursor. Pass next_cursor back as `cursor` for more results."""
+    try:
+        results = await asyncio.to_thread(search_products, query, with_links=True, cursor=cursor)
+    except CursorError as e:
+        return json.dumps({"response": str(e)})
+    if results.empty:
         return json.dumps({"response": "No products found."})
-    return products_json
+    return results.page_json()
 
 @tool
-def similar_products_search_with_links(product_name: str) -> str:
-    """Searches for similar products and returns them with a web link as a JSON string."""
-    products_json = get_similar_products_with_links(product_name)
-    products = json.loads(products_json)
-    if not products:
+async def similar_products_search_with_links(product_name: str, cursor: Optional[str] = None) -> str:
+    """Searches for similar products and returns one page of them with a web link as a JSON string with a next_cursor. Pass next_cursor back as `cursor` for more results."""
+    try:
+        results = await asyncio.to_thread(search_similar_products, product_name, with_links=True, cursor=cursor)
+    except CursorError as e:
+        return json.dumps({"response": str(e)})
+    if results.empty:
         return json.dumps({"response": "No similar products found."})
-    return products_json
+    return results.page_json()
 
 @tool
-def recipe_generator(ingredients: list[str]) -> str:
+async def recipe_generator(ingredients: list[str]) -> str:
     """Generates a recipe from a list of ingredients and returns it as a JSON string."""
-    return get_recipe(ingredients)
+    return await aget_recipe(ingredients)
 
 @tool
-def nutritional_info_getter(product_name: str) -> str:
+async def nutritional_info_getter(product_name: str) -> str:
     """Gets nutritional information for a product and returns it as a JSON string."""
     return get_nutritional_info(product_name)
 
 # Create a tool executor
 tools = [
     product_search,
+    fuzzy_product_search,
+    filtered_product_search,
+    latest_price_lookup,
+    cheapest_store_finder,
+    price_history_lookup,
     similar_products_search,
     recipe_generator,
     nutritional_info_getter,
     product_search_with_links,
     similar_products_search_with_links,
-]
\ No newline at end of file
+]
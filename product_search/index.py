@@ -0,0 +1,241 @@
+import re
+import numpy as np
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from thefuzz import fuzz
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+EMPTY_POSTINGS = np.empty(0, dtype=np.int32)
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Splits lowercased text into alphanumeric tokens.
+    """
+    return TOKEN_RE.findall(text.lower())
+
+
+def trigrams(text: str) -> set:
+    """
+    Returns the set of character trigrams in the text.
+    """
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _iter_rows(rows: np.ndarray, chunk: int = 512) -> Iterator[int]:
+    """
+    Iterates row ids as Python ints, converting a chunk at a time so an early
+    exit does not pay for converting the whole array.
+    """
+    for start in range(0, len(rows), chunk):
+        yield from rows[start:start + chunk].tolist()
+
+
+class PostingIndex:
+    """
+    An inverted index from string keys to sorted arrays of row ids.
+
+    Postings are stored CSR-style in two flat arrays (offsets and postings)
+    rather than one Python list per key, which keeps memory compact and lets
+    the arrays be saved and memory-mapped as-is.
+    """
+
+    def __init__(self, keys: List[str], offsets: np.ndarray, postings: np.ndarray):
+        self.keys = list(keys)
+        self.offsets = offsets
+        self.postings = postings
+        self._slots = {key: i for i, key in enumerate(self.keys)}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key: str):
+        return key in self._slots
+
+    @classmethod
+    def build(cls, docs: Iterable[Iterable[str]]) -> "PostingIndex":
+        """
+        Builds the index from one iterable of keys per row, in row order.
+        """
+        slots = {}
+        key_ids = []
+        row_ids = []
+        for row, keys in enumerate(docs):
+            for key in set(keys):
+                slot = slots.get(key)
+                if slot is None:
+                    slot = slots[key] = len(slots)
+                key_ids.append(slot)
+                row_ids.append(row)
+
+        key_ids = np.asarray(key_ids, dtype=np.int32)
+        row_ids = np.asarray(row_ids, dtype=np.int32)
+
+        # A stable sort by key keeps each posting list in ascending row order
+        order = np.argsort(key_ids, kind='stable')
+        postings = row_ids[order]
+        counts = np.bincount(key_ids, minlength=len(slots))
+        offsets = np.zeros(len(slots) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+
+        return cls(list(slots), offsets, postings)
+
+    def get(self, key: str) -> np.ndarray:
+        slot = self._slots.get(key)
+        if slot is None:
+            return EMPTY_POSTINGS
+        return self.postings[self.offsets[slot]:self.offsets[slot + 1]]
+
+
+class NameIndex:
+    """
+    Search index over product names, built once per catalog load.
+
+    Substring queries are answered from a character-trigram index: every name
+    containing the query must contain all of the query's trigrams, so the
+    intersection of their posting lists is a small candidate set that is then
+    verified in row order. A token index is kept alongside for word lookups.
+    """
+
+    def __init__(self, names: Iterable[str]):
+        self.names = [name.lower() for name in names]
+        self.trigrams = PostingIndex.build(trigrams(name) for name in self.names)
+        self.tokens = PostingIndex.build(tokenize(name) for name in self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+    @classmethod
+    def from_parts(cls, names: List[str], trigram_index: PostingIndex, token_index: PostingIndex) -> "NameIndex":
+        """
+        Reassembles an index from lowercased names and prebuilt postings, e.g. from a snapshot.
+        """
+        index = cls.__new__(cls)
+        index.names = names
+        index.trigrams = trigram_index
+        index.tokens = token_index
+        return index
+
+    def candidates(self, query: str, postings: Dict[str, np.ndarray] = None, after: Optional[int] = None) -> Optional[np.ndarray]:
+        """
+        Returns the sorted row ids that may contain the lowercased query, or
+        None when the query is too short to prune with trigrams. `postings` may
+        hold posting lists already fetched for a batch of queries. With `after`,
+        only rows past that row id are returned, and the posting lists are cut
+        before they are intersected.
+        """
+        grams = trigrams(query)
+        if not grams:
+            return None
+
+        if postings is None:
+            postings = {gram: self.trigrams.get(gram) for gram in grams}
+        lists = [postings[gram] for gram in grams]
+        if after is not None:
+            lists = [posting[np.searchsorted(posting, after + 1):] for posting in lists]
+        lists.sort(key=len)
+        result = lists[0]
+        for posting in lists[1:]:
+            if len(result) == 0:
+                break
+            result = np.intersect1d(result, posting, assume_unique=True)
+        return result
+
+    def search(self, query: str, limit: Optional[int] = 10, postings: Dict[str, np.ndarray] = None,
+               after: Optional[int] = None) -> List[int]:
+        """
+        Returns the row ids whose name contains the query (case-insensitive),
+        in catalog order, stopping after `limit` matches. With `after`, only
+        rows past that row id are considered, so a page can resume where the
+        previous one ended without re-matching the rows before it.
+        """
+        query = query.lower()
+        candidates = self.candidates(query, postings, after=after)
+        if candidates is None:
+            rows = range(0 if after is None else after + 1, len(self.names))
+        else:
+            rows = _iter_rows(candidates)
+
+        matches = []
+        for row in rows:
+            if query in self.names[row]:
+                matches.append(row)
+                if limit is not None and len(matches) >= limit:
+                    break
+        return matches
+
+    def find(self, name: str) -> Optional[int]:
+        """
+        Returns the first row whose name equals `name` (case-insensitive), or None.
+        """
+        name = name.lower()
+        candidates = self.candidates(name)
+        rows = range(len(self.names)) if candidates is None else _iter_rows(candidates)
+        for row in rows:
+            if self.names[row] == name:
+                return row
+        return None
+
+    def search_many(self, queries: List[str], limit: Optional[int] = 10) -> List[List[int]]:
+        """
+        Runs search() for a batch of queries, fetching each distinct trigram's
+        posting list once for the whole batch.
+        """
+        lowered = [query.lower() for query in queries]
+        grams = set().union(*(trigrams(query) for query in lowered)) if lowered else set()
+        postings = {gram: self.trigrams.get(gram) for gram in grams}
+        return [self.search(query, limit=limit, postings=postings) for query in lowered]
+
+    def fuzzy_candidates(self, query: str, limit: int = 50) -> List[int]:
+        """
+        Returns rows for up to `limit` distinct names sharing the most trigrams
+        with the query (q-gram blocking), best-first. Only these candidates are
+        scored with edit distance.
+        """
+        postings = [self.trigrams.get(gram) for gram in trigrams(query.lower())]
+        postings = [p for p in postings if len(p)]
+        if not postings:
+            return []
+
+        rows, counts = np.unique(np.concatenate(postings), return_counts=True)
+        order = np.argsort(-counts, kind='stable')
+
+        seen = set()
+        candidates = []
+        for row in rows[order].tolist():
+            name = self.names[row]
+            if name not in seen:
+                if len(seen) >= limit:
+                    continue
+                seen.add(name)
+            candidates.append(row)
+        return candidates
+
+    def fuzzy_search(self, query: str, limit: Optional[int] = 10, score_cutoff: int = 75,
+                     candidates: int = 50) -> List[Tuple[int, int]]:
+        """
+        Typo-tolerant name search. Returns (row, score) pairs ranked by score,
+        then catalog order, keeping only scores of at least `score_cutoff` (0-100).
+        """
+        query = query.lower().strip()
+        if len(query) < 3:
+            return [(row, 100) for row in self.search(query, limit=limit)]
+
+        scores = {}
+        ranked = []
+        for row in self.fuzzy_candidates(query, limit=candidates):
+            name = self.names[row]
+            if name not in scores:
+                # partial_ratio tolerates extra words in the name; token_set_ratio breaks ties
+                scores[name] = (fuzz.partial_ratio(query, name), fuzz.token_set_ratio(query, name))
+            score, tiebreak = scores[name]
+            if score >= score_cutoff:
+                ranked.append((-score, -tiebreak, row))
+
+        ranked.sort()
+        if limit is not None:
+            ranked = ranked[:limit]
+        return [(row, -score) for score, _, row in ranked]
+
+    def rows_with_token(self, token: str) -> np.ndarray:
+        return self.tokens.get(token.lower())
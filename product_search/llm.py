@@ -0,0 +1,77 @@
+import os
+import threading
+from typing import Any, Dict
+
+# Connections to the LLM API, shared by every model client in the process
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "64"))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "32"))
+
+# Seconds before an LLM request times out
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+
+# Chat models by role ("agent", "recipe"), created on first use
+chat_models: Dict[str, Any] = {}
+
+_clients = {}
+# Roles whose model was created here and so uses the shared clients
+_created = set()
+# Reentrant so chat_model() can create the clients while holding it
+_lock = threading.RLock()
+
+
+def http_clients():
+    """
+    The process's pooled sync and async HTTP clients for LLM calls, created
+    on first use. Every chat model shares them, so agent and recipe calls
+    reuse the same keep-alive connections.
+    """
+    if not _clients:
+        with _lock:
+            if not _clients:
+                import httpx
+                limits = httpx.Limits(max_connections=LLM_MAX_CONNECTIONS, max_keepalive_connections=LLM_MAX_KEEPALIVE)
+                timeout = httpx.Timeout(LLM_TIMEOUT, connect=10.0)
+                _clients["async"] = httpx.AsyncClient(limits=limits, timeout=timeout)
+                _clients["sync"] = httpx.Client(limits=limits, timeout=timeout)
+    return _clients["sync"], _clients["async"]
+
+
+def chat_model(role: str, **kwargs):
+    """
+    Returns the chat model for `role`, creating a ChatOpenAI with `kwargs`
+    the first time. langchain_openai is imported here rather than at module
+    import, so starting the server does not pay for it.
+    """
+    model = chat_models.get(role)
+    if model is None:
+        with _lock:
+            model = chat_models.get(role)
+            if model is None:
+                from langchain_openai import ChatOpenAI
+                sync_client, async_client = http_clients()
+                model = chat_models[role] = ChatOpenAI(http_client=sync_client, http_async_client=async_client, **kwargs)
+                _created.add(role)
+    return model
+
+
+def set_chat_model(role: str, model):
+    # Replaces the model for a role, e.g. with a scripted one for benchmarks
+    with _lock:
+        chat_models[role] = model
+        _created.discard(role)
+
+
+async def aclose():
+    """
+    Closes the shared HTTP clients. The models using them are dropped, so
+    the next chat_model() call creates new ones with fresh clients.
+    """
+    with _lock:
+        clients = dict(_clients)
+        _clients.clear()
+        for role in _created:
+            chat_models.pop(role, None)
+        _created.clear()
+    if clients:
+        await clients["async"].aclose()
+        clients["sync"].close()
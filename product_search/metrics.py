@@ -0,0 +1,256 @@
+import os
+import json
+import time
+import bisect
+import inspect
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Requests slower than this many seconds have their span tree logged (0 disables)
+SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", "0"))
+
+# Histogram buckets in seconds, from sub-millisecond catalog lookups to multi-second LLM calls
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """
+    A monotonically increasing count per label set, in Prometheus text format.
+    """
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+        registry.append(self)
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            return [f"{self.name}{_labels(self.labels, key)} {value:g}" for key, value in sorted(self.values.items())]
+
+
+class Histogram:
+    """
+    Observations counted into cumulative buckets per label set, with their
+    sum and count, in Prometheus text format.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        self.values: Dict[Tuple, list] = {}
+        self._lock = threading.Lock()
+        registry.append(self)
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        # Per-bucket counts; the cumulative sums are taken when rendering
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            for key, (counts, total, count) in sorted(self.values.items()):
+                cumulative = 0
+                for bound, bucket in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += bucket
+                    le = 'le="+Inf"' if bound == float("inf") else f'le="{bound:g}"'
+                    lines.append(f"{self.name}_bucket{_labels(self.labels, key, le)} {cumulative}")
+                lines.append(f"{self.name}_sum{_labels(self.labels, key)} {total:.6f}")
+                lines.append(f"{self.name}_count{_labels(self.labels, key)} {count}")
+        return lines
+
+
+registry: List[Any] = []
+
+# Callables returning (name, type, help, [(labels, value)]) for values owned elsewhere, read at scrape time
+collectors: List[Callable[[], List[Tuple[str, str, str, List[Tuple[Dict[str, Any], float]]]]]] = []
+
+
+def render() -> str:
+    """
+    All metrics in the Prometheus text exposition format.
+    """
+    lines = []
+    for metric in registry:
+        samples = metric.samples()
+        if not samples:
+            continue
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(samples)
+    for collect in collectors:
+        try:
+            families = collect()
+        except Exception as e:
+            print(f"Error collecting metrics: {e}")
+            continue
+        for name, kind, help, values in families:
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in values:
+                names = tuple(labels)
+                lines.append(f"{name}{_labels(names, tuple(labels[n] for n in names))} {value:g}")
+    return "\n".join(lines) + "\n"
+
+
+http_request_seconds = Histogram("mcp_http_request_seconds", "HTTP request latency", ("method", "route", "status"))
+agent_node_seconds = Histogram("mcp_agent_node_seconds", "Time spent in each agent graph node", ("node",))
+tool_seconds = Histogram("mcp_tool_seconds", "Tool execution time", ("tool", "outcome"))
+search_seconds = Histogram("mcp_search_seconds", "Catalog search time, cache lookup included", ("search",))
+cache_lookup_seconds = Histogram("mcp_cache_lookup_seconds", "Result cache lookup time", ("cache",))
+catalog_load_seconds = Histogram("mcp_catalog_load_seconds", "Catalog load time", ("source",),
+                                 buckets=(0.01, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0))
+response_parse_seconds = Histogram("mcp_response_parse_seconds", "Parsing the agent's final answer", ())
+agent_iterations = Histogram("mcp_agent_iterations", "Model calls per agent run", (),
+                             buckets=(1, 2, 3, 4, 5, 6, 8, 10, 15, 20))
+llm_tokens_total = Counter("mcp_llm_tokens_total", "LLM tokens used by the agent", ("kind",))
+llm_calls_total = Counter("mcp_llm_calls_total", "LLM calls made by the agent", ())
+
+
+class Span:
+    """
+    One timed operation in a request's span tree.
+    """
+
+    __slots__ = ("name", "attributes", "start", "duration", "children", "error")
+
+    def __init__(self, name: str, attributes: Dict[str, Any]):
+        self.name = name
+        self.attributes = attributes
+        self.start = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.children: List["Span"] = []
+        self.error: Optional[str] = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def to_dict(self, origin: float = None) -> dict:
+        origin = self.start if origin is None else origin
+        data = {"name": self.name, "start_ms": round((self.start - origin) * 1000, 3),
+                "duration_ms": round((self.duration or 0) * 1000, 3)}
+        if self.attributes:
+            data["attributes"] = self.attributes
+        if self.error:
+            data["error"] = self.error
+        if self.children:
+            data["children"] = [child.to_dict(origin) for child in sorted(self.children, key=lambda c: c.start)]
+        return data
+
+
+# The innermost open span of the current request; asyncio tasks and to_thread() inherit it
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+@contextmanager
+def span(name: str, histogram: Optional[Histogram] = None, **labels):
+    """
+    Times a block as a child of the current span, and records the duration
+    in `histogram` if given, labelled from `labels` and any attributes set
+    on the span. Spans opened in tasks or threads started inside the block
+    nest under it.
+    """
+    node = Span(name, dict(labels))
+    parent = _current_span.get()
+    if parent is not None:
+        parent.children.append(node)
+    token = _current_span.set(node)
+    try:
+        yield node
+    except BaseException as e:
+        node.error = type(e).__name__
+        raise
+    finally:
+        node.duration = time.perf_counter() - node.start
+        _current_span.reset(token)
+        if histogram is not None:
+            # Attributes set inside the block (an outcome, say) can fill in histogram labels
+            histogram.observe(node.duration, **node.attributes)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def timed(name: str, histogram: Optional[Histogram] = None, **labels):
+    """
+    Decorator form of span() for plain and async functions.
+    """
+    def decorate(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(name, histogram, **labels):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name, histogram, **labels):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def record_llm_usage(message, estimated_total: int):
+    """
+    Counts one LLM call and its tokens, split into prompt and completion
+    when the API reports them, and adds them to the current span.
+    """
+    llm_calls_total.inc()
+    usage = getattr(message, "usage_metadata", None) or {}
+    prompt, completion = usage.get("input_tokens"), usage.get("output_tokens")
+    if prompt is None:
+        token_usage = (getattr(message, "response_metadata", None) or {}).get("token_usage") or {}
+        prompt, completion = token_usage.get("prompt_tokens"), token_usage.get("completion_tokens")
+    if prompt is not None and completion is not None:
+        llm_tokens_total.inc(prompt, kind="prompt")
+        llm_tokens_total.inc(completion, kind="completion")
+        attributes = {"prompt_tokens": prompt, "completion_tokens": completion}
+    else:
+        llm_tokens_total.inc(estimated_total, kind="estimated")
+        attributes = {"estimated_tokens": estimated_total}
+    node = _current_span.get()
+    if node is not None:
+        node.set(**attributes)
+
+
+def log_if_slow(root: Span, threshold: float = SLOW_REQUEST_SECONDS):
+    # Prints the whole span tree of a slow request as one JSON line
+    if threshold > 0 and root.duration is not None and root.duration >= threshold:
+        print(f"Slow request ({root.duration:.3f}s): {json.dumps(root.to_dict(), default=str)}")
@@ -0,0 +1,58 @@
+import base64
+import hashlib
+import orjson
+from typing import Any, List, Optional, Union
+
+# Largest page the search tools and endpoints will return
+MAX_PAGE_SIZE = 100
+
+
+class CursorError(ValueError):
+    """
+    Raised for a cursor that is malformed, belongs to a different query, or
+    was issued for a catalog version that is no longer current.
+    """
+
+
+def query_digest(*params: Any) -> str:
+    """
+    Short hash of the parameters that define a result ordering.
+    """
+    return hashlib.sha256(orjson.dumps(params)).hexdigest()[:12]
+
+
+# A position is a non-negative integer or a short list of them, e.g. a row id or (anchor row, offset)
+Position = Union[int, List[int]]
+
+
+def encode_cursor(version: str, query: str, position: Position) -> str:
+    """
+    Encodes where the next page starts as an opaque, URL-safe token.
+
+    The cursor carries the catalog version and the query digest, so it is
+    rejected after a reload or when replayed against another query, rather
+    than silently returning a page from a different ordering.
+    """
+    raw = orjson.dumps({"v": version, "q": query, "p": position})
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str], version: str, query: str) -> Optional[Position]:
+    """
+    Returns the position stored in the cursor, or None when there is no cursor.
+    """
+    if not cursor:
+        return None
+    try:
+        data = orjson.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        position = data["p"]
+    except (ValueError, KeyError, TypeError):
+        raise CursorError("Malformed cursor")
+    values = position if isinstance(position, list) else [position]
+    if not values or not all(type(value) is int and value >= 0 for value in values):
+        raise CursorError("Malformed cursor")
+    if data.get("q") != query:
+        raise CursorError("Cursor belongs to a different query")
+    if data.get("v") != version:
+        raise CursorError("The catalog has changed since this cursor was issued; start again without a cursor")
+    return position
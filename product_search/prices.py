@@ -0,0 +1,347 @@
+import os
+import json
+import time
+import shutil
+import tempfile
+import threading
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional, Tuple
+from .catalog import CSV_PATH, RELOAD_INTERVAL, file_digest, normalize_column
+
+# Directory of daily product CSVs (same layout as the catalog CSV) ingested into the price history
+PRICE_HISTORY_DIR = os.getenv("PRICE_HISTORY_DIR", "/app/CSVs/history")
+
+# Where ingested price chunks are kept so restarts skip re-parsing history ("" keeps them in memory only)
+PRICE_STORE_DIR = os.getenv("PRICE_STORE_DIR", "")
+
+SALE_TYPES = ["REGULAR", "SPECIAL"]
+
+FIELDS = ("codes", "stores", "dates", "prices", "special")
+
+# CSV columns the price history reads, after normalize_column()
+USE_COLUMNS = ["date", "store_id", "code", "price", "sale_type"]
+
+
+class PriceChunk:
+    """
+    An immutable block of price observations sorted by (code, store, date),
+    with one observation per key.
+
+    Columns are flat arrays: int32 code ids, store ids and YYYYMMDD dates,
+    a float64 price and a one-byte on-sale flag, about 21 bytes per observation.
+    """
+
+    __slots__ = FIELDS
+
+    def __init__(self, codes: np.ndarray, stores: np.ndarray, dates: np.ndarray, prices: np.ndarray,
+                 special: np.ndarray):
+        self.codes = codes
+        self.stores = stores
+        self.dates = dates
+        self.prices = prices
+        self.special = special
+
+    def __len__(self):
+        return len(self.codes)
+
+    @classmethod
+    def build(cls, codes, stores, dates, prices, special) -> "PriceChunk":
+        """
+        Sorts observations by key; for duplicate keys the last one given wins.
+        """
+        # lexsort is stable, so among equal keys the later observation stays last
+        order = np.lexsort((dates, stores, codes))
+        codes, stores, dates, prices, special = (np.asarray(a)[order] for a in (codes, stores, dates, prices, special))
+        keep = np.ones(len(codes), dtype=bool)
+        keep[:-1] = (codes[1:] != codes[:-1]) | (stores[1:] != stores[:-1]) | (dates[1:] != dates[:-1])
+        return cls(codes[keep], stores[keep], dates[keep], prices[keep], special[keep])
+
+    @classmethod
+    def merge(cls, older: "PriceChunk", newer: "PriceChunk") -> "PriceChunk":
+        return cls.build(*(np.concatenate([getattr(older, f), getattr(newer, f)]) for f in FIELDS))
+
+    def span(self, code_id: int) -> slice:
+        return slice(int(np.searchsorted(self.codes, code_id, side="left")),
+                     int(np.searchsorted(self.codes, code_id, side="right")))
+
+    def take(self, rows) -> "PriceChunk":
+        return PriceChunk(*(getattr(self, f)[rows] for f in FIELDS))
+
+
+class PriceStore:
+    """
+    Price history across stores and dates, indexed by (code, store_id, date).
+
+    Each ingested CSV becomes a sorted chunk. Chunks are merged when the one
+    before is no bigger (like carries in a binary counter), so there are
+    O(log n) chunks and an ingest parses and sorts only the new file plus the
+    occasional merge of already-sorted arrays; history is never re-parsed.
+    A lookup binary-searches each chunk for the product's range. Readers use
+    the current chunk list without locking; ingests publish a new list.
+    """
+
+    def __init__(self, store_dir: str = PRICE_STORE_DIR):
+        self.store_dir = store_dir
+        self.codes: List[str] = []
+        self._code_ids: Dict[str, int] = {}
+        self.chunks: List[PriceChunk] = []
+        self.sources = set()
+        self._seen: Dict[str, Tuple[int, float]] = {}
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._checked = None
+
+    def __len__(self):
+        return sum(len(chunk) for chunk in self.chunks)
+
+    def __contains__(self, code: str):
+        return code in self._code_ids
+
+    def _code_ids_for(self, codes: np.ndarray) -> np.ndarray:
+        local, uniques = pd.factorize(codes)
+        ids = np.empty(len(uniques), dtype=np.int32)
+        for i, code in enumerate(uniques):
+            code_id = self._code_ids.get(code)
+            if code_id is None:
+                code_id = self._code_ids[code] = len(self.codes)
+                self.codes.append(code)
+            ids[i] = code_id
+        return ids[local]
+
+    def ingest_frame(self, frame: pd.DataFrame) -> int:
+        """
+        Adds the observations in a frame with date, store_id, code, price
+        and sale_type columns. Returns the number of rows ingested.
+        """
+        frame = frame.dropna(subset=["code", "price"])
+        with self._lock:
+            chunk = PriceChunk.build(
+                self._code_ids_for(frame["code"].astype(str).to_numpy()),
+                frame["store_id"].to_numpy(dtype=np.int32),
+                frame["date"].to_numpy(dtype=np.int32),
+                frame["price"].to_numpy(dtype=np.float64),
+                (frame["sale_type"].astype(str).str.upper() == "SPECIAL").to_numpy(dtype=np.uint8),
+            )
+            self._append(chunk)
+        return len(frame)
+
+    def ingest_csv(self, path: str) -> int:
+        """
+        Ingests a daily CSV unless a file with the same content already was.
+        Returns the number of rows ingested.
+        """
+        stat = os.stat(path)
+        if self._seen.get(path) == (stat.st_size, stat.st_mtime):
+            return 0
+        digest = file_digest(path)
+        if digest in self.sources:
+            self._seen[path] = (stat.st_size, stat.st_mtime)
+            return 0
+
+        frame = self._load_saved(digest)
+        if frame is None:
+            frame = pd.read_csv(path, dtype={"Code": str}, usecols=lambda col: normalize_column(col) in USE_COLUMNS)
+            frame.columns = [normalize_column(col) for col in frame.columns]
+            self._save(digest, frame)
+        rows = self.ingest_frame(frame)
+        self.sources.add(digest)
+        self._seen[path] = (stat.st_size, stat.st_mtime)
+        print(f"Ingested {rows} price observations from {path}")
+        return rows
+
+    def _append(self, chunk: PriceChunk):
+        if len(chunk) == 0:
+            return
+        chunks = self.chunks + [chunk]
+        while len(chunks) > 1 and len(chunks[-2]) <= len(chunks[-1]):
+            newer = chunks.pop()
+            chunks.append(PriceChunk.merge(chunks.pop(), newer))
+        self.chunks = chunks
+
+    def _save(self, digest: str, frame: pd.DataFrame):
+        # Saved per source file with its own code strings, so chunks stay valid across restarts
+        if not self.store_dir:
+            return
+        target = os.path.join(self.store_dir, digest)
+        if os.path.exists(target):
+            return
+        os.makedirs(self.store_dir, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=f".{digest}-", dir=self.store_dir)
+        try:
+            codes, uniques = pd.factorize(frame["code"].astype(str))
+            np.save(os.path.join(staging, "codes.npy"), codes.astype(np.int32))
+            with open(os.path.join(staging, "codes.json"), "w") as f:
+                json.dump([str(code) for code in uniques], f)
+            for col in ("date", "store_id"):
+                np.save(os.path.join(staging, f"{col}.npy"), frame[col].to_numpy(dtype=np.int32))
+            np.save(os.path.join(staging, "price.npy"), frame["price"].to_numpy(dtype=np.float64))
+            np.save(os.path.join(staging, "special.npy"),
+                    (frame["sale_type"].astype(str).str.upper() == "SPECIAL").to_numpy(dtype=np.uint8))
+            os.chmod(staging, 0o755)
+            os.rename(staging, target)
+        except OSError as e:
+            # Another worker may have saved the same file first
+            shutil.rmtree(staging, ignore_errors=True)
+            if not os.path.exists(target):
+                print(f"Could not save price chunk {digest}: {e}")
+
+    def _load_saved(self, digest: str) -> Optional[pd.DataFrame]:
+        directory = os.path.join(self.store_dir, digest) if self.store_dir else None
+        if directory is None or not os.path.isdir(directory):
+            return None
+        with open(os.path.join(directory, "codes.json")) as f:
+            codes = np.asarray(json.load(f), dtype=object)
+        return pd.DataFrame({
+            "date": np.load(os.path.join(directory, "date.npy")),
+            "store_id": np.load(os.path.join(directory, "store_id.npy")),
+            "code": codes[np.load(os.path.join(directory, "codes.npy"))],
+            "price": np.load(os.path.join(directory, "price.npy")),
+            "sale_type": np.where(np.load(os.path.join(directory, "special.npy")) == 1, "SPECIAL", "REGULAR"),
+        })
+
+    def refresh(self, csv_path: str = CSV_PATH, history_dir: str = PRICE_HISTORY_DIR,
+                interval: float = RELOAD_INTERVAL):
+        """
+        Ingests the catalog CSV and any new CSVs in the history directory,
+        at most once per `interval` seconds. The first call loads history;
+        later calls return right away while another thread is ingesting.
+        """
+        now = time.monotonic()
+        if self._checked is not None and now - self._checked < max(interval, 0):
+            return
+        if self._checked is None:
+            with self._refresh_lock:
+                if self._checked is None:
+                    self._ingest_all(csv_path, history_dir)
+                    self._checked = time.monotonic()
+            return
+        if not self._refresh_lock.acquire(blocking=False):
+            return
+        try:
+            self._ingest_all(csv_path, history_dir)
+            self._checked = time.monotonic()
+        finally:
+            self._refresh_lock.release()
+
+    def _ingest_all(self, csv_path: str, history_dir: str):
+        paths = []
+        if history_dir and os.path.isdir(history_dir):
+            # Daily files are expected to be named by date, so name order is ingest order
+            paths = sorted(os.path.join(history_dir, name) for name in os.listdir(history_dir) if name.endswith(".csv"))
+        if csv_path and os.path.exists(csv_path):
+            paths.append(csv_path)
+        for path in paths:
+            try:
+                self.ingest_csv(path)
+            except Exception as e:
+                print(f"Error ingesting price history from {path}: {e}")
+
+    def series(self, code: str) -> Optional[PriceChunk]:
+        """
+        All observations of a product, sorted by (store, date).
+        """
+        code_id = self._code_ids.get(code)
+        if code_id is None:
+            return None
+        parts = [chunk.take(chunk.span(code_id)) for chunk in self.chunks]
+        parts = [part for part in parts if len(part)]
+        if not parts:
+            return None
+        if len(parts) == 1:
+            return parts[0]
+        # Chunks are in ingest order, so a later observation of the same key wins
+        return PriceChunk.build(*(np.concatenate([getattr(part, f) for part in parts]) for f in FIELDS))
+
+    @staticmethod
+    def _point(series: PriceChunk, i: int) -> dict:
+        return {
+            "date": int(series.dates[i]),
+            "store_id": int(series.stores[i]),
+            "price": float(series.prices[i]),
+            "sale_type": SALE_TYPES[int(series.special[i])],
+        }
+
+    @staticmethod
+    def _store_span(series: PriceChunk, store_id: int) -> slice:
+        return slice(int(np.searchsorted(series.stores, store_id, side="left")),
+                     int(np.searchsorted(series.stores, store_id, side="right")))
+
+    def latest(self, code: str, store_id: int) -> Optional[dict]:
+        """
+        The most recent price of a product at a store.
+        """
+        series = self.series(code)
+        if series is None:
+            return None
+        span = self._store_span(series, store_id)
+        if span.stop == span.start:
+            return None
+        return self._point(series, span.stop - 1)
+
+    def cheapest(self, code: str, as_of: Optional[int] = None, limit: int = 5) -> List[dict]:
+        """
+        The stores with the lowest current price for a product, using each
+        store's latest price on or before `as_of` (default: latest overall).
+        """
+        series = self.series(code)
+        if series is None:
+            return []
+        if as_of is not None:
+            series = series.take(series.dates <= as_of)
+        if len(series) == 0:
+            return []
+        # Sorted by (store, date): the last observation of each store run is its current price
+        ends = np.flatnonzero(np.append(series.stores[1:] != series.stores[:-1], True))
+        order = np.lexsort((series.stores[ends], series.prices[ends]))[:limit]
+        return [self._point(series, i) for i in ends[order].tolist()]
+
+    def history(self, code: str, store_id: Optional[int] = None, start: Optional[int] = None,
+                end: Optional[int] = None, limit: int = 1000) -> Optional[dict]:
+        """
+        Price observations of a product between `start` and `end` (inclusive
+        YYYYMMDD dates), optionally at one store, with min / max / mean over
+        the whole range. Points are ordered by date then store, and only the
+        most recent `limit` are returned.
+        """
+        series = self.series(code)
+        if series is None:
+            return None
+        if store_id is not None:
+            series = series.take(self._store_span(series, store_id))
+        mask = np.ones(len(series), dtype=bool)
+        if start is not None:
+            mask &= series.dates >= start
+        if end is not None:
+            mask &= series.dates <= end
+        series = series.take(mask)
+
+        order = np.lexsort((series.stores, series.dates))[-limit:] if limit > 0 else np.empty(0, dtype=np.int64)
+        prices = series.prices
+        return {
+            "code": code,
+            "count": len(series),
+            "min_price": float(prices.min()) if len(prices) else None,
+            "max_price": float(prices.max()) if len(prices) else None,
+            "mean_price": round(float(prices.mean()), 4) if len(prices) else None,
+            "points": [self._point(series, i) for i in order.tolist()],
+        }
+
+    def stats(self) -> dict:
+        return {
+            "observations": len(self),
+            "chunks": len(self.chunks),
+            "products": len(self.codes),
+            "sources": len(self.sources),
+        }
+
+
+price_store = PriceStore()
+
+
+def get_price_store() -> PriceStore:
+    """
+    Returns the price store, ingesting new daily CSVs at most once per reload interval.
+    """
+    price_store.refresh()
+    return price_store
@@ -0,0 +1,79 @@
+import orjson
+from typing import List, Optional
+
+# Fields of ProductResponse, in schema order, that come straight from catalog columns
+ROW_FIELDS = [
+    "date", "store_id", "code", "article_number", "name", "aisle",
+    "brand", "package_size", "price", "unit", "sale_type", "unit_price", "unit_price_basis",
+]
+
+NULL_LINK = b',"product_link":null'
+NULL_SCORE = b',"match_score":null}'
+
+
+class ProductResults:
+    """
+    Structured result of a catalog search: the matching row ids (plus optional
+    match scores) against the catalog they came from.
+
+    Rows are encoded straight from the catalog's columns to JSON bytes with
+    orjson, skipping per-row DataFrame slicing and model construction. The
+    catalog columns are type-checked once at load, so the output is valid
+    ProductResponse JSON and is only validated again at the HTTP boundary.
+    """
+
+    __slots__ = ("catalog", "rows", "scores", "with_links", "next_cursor")
+
+    def __init__(self, catalog, rows: List[int], with_links: bool = False, scores: Optional[List[float]] = None,
+                 next_cursor: Optional[str] = None):
+        self.catalog = catalog
+        self.rows = list(rows)
+        self.with_links = with_links
+        self.scores = scores
+        self.next_cursor = next_cursor
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def empty(self) -> bool:
+        return not self.rows
+
+    def _encode_row(self, i: int, row: int) -> bytes:
+        fragment = self.catalog.row_fragment(row)
+        link = orjson.dumps(self.catalog.links[row]) if self.with_links else None
+        link = b',"product_link":' + link if link is not None else NULL_LINK
+        if self.scores is None:
+            return fragment + link + NULL_SCORE
+        return fragment + link + b',"match_score":' + orjson.dumps(float(self.scores[i])) + b'}'
+
+    def json_bytes(self) -> bytes:
+        return b"[" + b",".join(self._encode_row(i, row) for i, row in enumerate(self.rows)) + b"]"
+
+    def json(self) -> str:
+        return self.json_bytes().decode()
+
+    def page_json_bytes(self) -> bytes:
+        """
+        The results as a page: {"products": [...], "next_cursor": ...}.
+        """
+        return b'{"products":' + self.json_bytes() + b',"next_cursor":' + orjson.dumps(self.next_cursor) + b'}'
+
+    def page_json(self) -> str:
+        return self.page_json_bytes().decode()
+
+    def records(self) -> List[dict]:
+        return orjson.loads(self.json_bytes())
+
+    def to_cache(self) -> str:
+        """
+        Compact, catalog-relative form for the tool cache (row ids, not products).
+        """
+        return orjson.dumps({
+            "rows": self.rows, "scores": self.scores, "links": self.with_links, "cursor": self.next_cursor,
+        }).decode()
+
+    @classmethod
+    def from_cache(cls, catalog, value: str) -> "ProductResults":
+        data = orjson.loads(value)
+        return cls(catalog, data["rows"], with_links=data["links"], scores=data["scores"], next_cursor=data.get("cursor"))
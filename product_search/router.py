@@ -0,0 +1,190 @@
+import os
+import re
+from typing import List, NamedTuple, Optional
+from .schema import SearchResponse
+from .tools import search_products, search_products_many, search_similar_products
+
+# Set MCP_FAST_PATH=0 to send every query through the LLM agent
+FAST_PATH_ENABLED = os.getenv("MCP_FAST_PATH", "1") != "0"
+
+# Longest product argument (in words) the router will handle on its own
+MAX_ARGUMENT_WORDS = 4
+
+# Anything hinting at recipes, nutrition, comparisons, price constraints or
+# several items at once needs the LLM to interpret it
+AMBIGUOUS_RE = re.compile(
+    r"\b(recipes?|cook|cooking|make|meal|nutrition\w*|calories?|protein|fat|carbs?|healthy|"
+    r"cheap\w*|expensive|price\w*|cost|under|over|below|above|less|more|compare|vs|versus|best|"
+    r"and|or|with(?!\s+(?:a\s+)?(?:links?|urls?)\b)|without|how|why|which|what(?!'s similar| is similar| are similar)|when)\b"
+    r"|[,;&$\d]"
+)
+
+# Every word is anchored with \b so the phrase never starts inside a product name ("pizza links" is not "pizz" + "a links")
+LINK_RE = re.compile(
+    r"\s*(?:,\s*)?(?:\band\s+)?(?:\bplease\s+)?(?:\b(?:with|give me|include|including|send|show me)\b)?\s*"
+    r"(?:\b(?:the|a)\s+)?(?:\bweb\s+)?\b(?:links?|urls?)\b(?:\s+(?:to|for)\s+(?:them|it|those|these))?"
+)
+
+SIMILAR_RE = re.compile(
+    r"^(?:(?:can you\s+)?(?:please\s+)?(?:find|show|get|give|list|recommend|suggest)(?: me)?\s+)?"
+    r"(?:what(?:'s| is| are)\s+)?(?:some\s+|any\s+)?(?:other\s+)?(?:products?\s+|items?\s+|things?\s+|alternatives?\s+)?"
+    r"(?:similar to|like|alternatives? (?:to|for)|related to|comparable to)\s+(?P<arg>.+)$"
+)
+
+SEARCH_RE = re.compile(
+    r"^(?:(?:can you\s+)?(?:please\s+)?(?:find|search for|search|look for|look up|show|get|give|list|fetch)(?: me)?"
+    r"|i (?:need|want)|i'm looking for|im looking for|do you (?:have|sell|carry)|is there|are there)\s+"
+    r"(?:some\s+|any\s+|a\s+|an\s+|the\s+)?(?P<arg>.+)$"
+)
+
+BARE_RE = re.compile(r"^[a-z][a-z' -]*$")
+
+# A bare phrase addressed to someone ("tell me a joke") is conversation, not a product name
+CONVERSATIONAL_RE = re.compile(r"\b(?:i|me|my|you|your|we|us|our|hi|hello|hey|thanks|thank)\b")
+
+# Replies and function words that are never a product on their own ("ok", "yes", "no", "cool")
+NON_PRODUCT_WORDS = frozenset("""
+    ok okay k yes yeah yep yup no nope nah sure cool nice great good fine fair alright right wow lol hmm
+    maybe thx ty bye goodbye done stop again more continue next back help test it this that these those
+    them they there here something anything everything nothing is are was be do does not so just also too
+""".split())
+
+# Shortest bare query (one without a search verb) routed to search
+MIN_BARE_ARGUMENT = 3
+
+FILLER_RE = re.compile(r"\b(?:please|products?|items?|for me|in stock|available)\b")
+
+
+class Route(NamedTuple):
+    tool: str
+    argument: str
+    with_links: bool
+
+
+def normalize_query(query: str) -> str:
+    """
+    Lowercases the query, collapses whitespace and trims surrounding punctuation.
+    """
+    query = re.sub(r"\s+", " ", query.lower()).strip()
+    return query.strip(" .!?\"'")
+
+
+def _clean_argument(argument: str) -> str:
+    argument = FILLER_RE.sub(" ", argument)
+    argument = re.sub(r"^(?:some|any|a|an|the)\s+", "", re.sub(r"\s+", " ", argument).strip())
+    return argument.strip(" .!?\"'")
+
+
+def route(query: str) -> Optional[Route]:
+    """
+    Classifies a query with keyword rules. Returns a Route for high-confidence
+    product or similar-product searches, or None when the LLM should decide.
+    """
+    text = normalize_query(query)
+    with_links = bool(re.search(r"\b(?:links?|urls?)\b", text))
+    if with_links:
+        text = normalize_query(LINK_RE.sub(" ", text))
+
+    if not text or AMBIGUOUS_RE.search(text):
+        return None
+
+    match = SIMILAR_RE.match(text)
+    if match:
+        tool = "similar_products"
+    else:
+        tool = "products"
+        match = SEARCH_RE.match(text)
+
+    if match:
+        argument = _clean_argument(match.group("arg"))
+    elif BARE_RE.match(text) and not CONVERSATIONAL_RE.search(text):
+        argument = _clean_argument(text)
+        # Without a search verb, short replies like "ok" or "no" are conversation, not products
+        if len(argument) < MIN_BARE_ARGUMENT:
+            return None
+    else:
+        return None
+
+    if not argument or not BARE_RE.match(argument) or len(argument.split()) > MAX_ARGUMENT_WORDS:
+        return None
+    if all(word in NON_PRODUCT_WORDS for word in argument.split()):
+        return None
+    return Route(tool, argument, with_links)
+
+
+def cache_key(query: str) -> str:
+    """
+    Maps equivalent queries ("milk", "find me milk", "Milk") to the same key.
+    """
+    matched = route(query)
+    if matched is not None:
+        return f"{matched.tool}:{matched.argument}:{int(matched.with_links)}"
+    return f"query:{normalize_query(query)}"
+
+
+def _run(route: Route) -> list:
+    search = search_similar_products if route.tool == "similar_products" else search_products
+
+    results = search(route.argument, with_links=route.with_links)
+    # Plural queries ("apples") should still match singular names ("Apple Juice")
+    if results.empty and route.tool == "products" and route.argument.endswith("s"):
+        results = search(route.argument[:-1], with_links=route.with_links)
+    return results.records()
+
+
+def _respond(matched: Route, products: list) -> Optional[SearchResponse]:
+    if not products:
+        return None
+
+    links = " with links" if matched.with_links else ""
+    if matched.tool == "similar_products":
+        summary = f"Found {len(products)} products similar to '{matched.argument}'{links}."
+    else:
+        summary = f"Found {len(products)} products matching '{matched.argument}'{links}."
+    return SearchResponse(products=products, summary=summary)
+
+
+def fast_path(query: str) -> Optional[SearchResponse]:
+    """
+    Answers simple product queries without the LLM. Returns None when the
+    query is ambiguous or found nothing, so the agent can take over.
+    """
+    if not FAST_PATH_ENABLED:
+        return None
+
+    matched = route(query)
+    if matched is None:
+        return None
+    return _respond(matched, _run(matched))
+
+
+def fast_path_many(queries: List[str]) -> List[Optional[SearchResponse]]:
+    """
+    fast_path for a batch of queries. Product searches are grouped so the
+    name index is walked once per group instead of once per query.
+    """
+    if not FAST_PATH_ENABLED:
+        return [None] * len(queries)
+
+    routes = [route(query) for query in queries]
+    products = [[] for _ in queries]
+
+    for with_links in (False, True):
+        group = [i for i, r in enumerate(routes) if r is not None and r.tool == "products" and r.with_links == with_links]
+        for i, results in zip(group, search_products_many([routes[i].argument for i in group], with_links)):
+            products[i] = results.records()
+
+        # Plural queries that found nothing get one more batched pass in the singular
+        retry = [i for i in group if not products[i] and routes[i].argument.endswith("s")]
+        for i, results in zip(retry, search_products_many([routes[i].argument[:-1] for i in retry], with_links)):
+            products[i] = results.records()
+
+    responses = []
+    for i, matched in enumerate(routes):
+        if matched is None:
+            responses.append(None)
+            continue
+        if matched.tool == "similar_products":
+            products[i] = _run(matched)
+        responses.append(_respond(matched, products[i]))
+    return responses
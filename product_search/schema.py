@@ -13,7 +13,10 @@ class Product(BaseModel):
     price: float = Field(..., description="Price of the product")
     unit: str = Field(..., description="Unit of measurement for the price")
     sale_type: str = Field(..., description="Type of sale (e.g., REGULAR, SPECIAL)")
+    unit_price: Optional[float] = Field(None, description="Price per unit_price_basis, from the package size")
+    unit_price_basis: Optional[str] = Field(None, description="Quantity the unit price is for (100 g, 100 ml or 1 ea)")
     product_link: Optional[str] = Field(None, description="URL link to the product page")
+    match_score: Optional[float] = Field(None, description="Fuzzy match score (0-100), set by fuzzy search")
 
 class ProductResponse(BaseModel):
     date: int = Field(..., description="Date of the record")
@@ -27,7 +30,42 @@ class ProductResponse(BaseModel):
     price: float = Field(..., description="Price of the product")
     unit: str = Field(..., description="Unit of measurement for the price")
     sale_type: str = Field(..., description="Type of sale (e.g., REGULAR, SPECIAL)")
+    unit_price: Optional[float] = Field(None, description="Price per unit_price_basis, from the package size")
+    unit_price_basis: Optional[str] = Field(None, description="Quantity the unit price is for (100 g, 100 ml or 1 ea)")
     product_link: Optional[str] = Field(None, description="URL link to the product page")
+    match_score: Optional[float] = Field(None, description="Fuzzy match score (0-100), set by fuzzy search")
+
+class ProductListResponse(BaseModel):
+    products: List[ProductResponse] = Field(..., description="Matching products, in result order")
+    next_cursor: Optional[str] = Field(None, description="Pass as `cursor` to fetch the next page; null on the last page")
+
+class PricePoint(BaseModel):
+    date: int = Field(..., description="Date of the price (YYYYMMDD)")
+    store_id: int = Field(..., description="ID of the store")
+    price: float = Field(..., description="Price of the product")
+    sale_type: str = Field(..., description="Type of sale (e.g., REGULAR, SPECIAL)")
+
+class LatestPriceResponse(BaseModel):
+    code: str = Field(..., description="Product code")
+    name: Optional[str] = Field(None, description="Name of the product, if it is in the current catalog")
+    store_id: int = Field(..., description="ID of the store")
+    latest: Optional[PricePoint] = Field(None, description="Most recent price at the store; null if never sold there")
+
+class CheapestStoresResponse(BaseModel):
+    code: str = Field(..., description="Product code")
+    name: Optional[str] = Field(None, description="Name of the product, if it is in the current catalog")
+    as_of: Optional[int] = Field(None, description="Prices are each store's latest on or before this date")
+    stores: List[PricePoint] = Field(..., description="Stores by ascending current price")
+
+class PriceHistoryResponse(BaseModel):
+    code: str = Field(..., description="Product code")
+    name: Optional[str] = Field(None, description="Name of the product, if it is in the current catalog")
+    store_id: Optional[int] = Field(None, description="Store the history is for; null for all stores")
+    count: int = Field(..., description="Number of prices in the date range")
+    min_price: Optional[float] = Field(None, description="Lowest price in the date range")
+    max_price: Optional[float] = Field(None, description="Highest price in the date range")
+    mean_price: Optional[float] = Field(None, description="Mean price in the date range")
+    points: List[PricePoint] = Field(..., description="The most recent prices in the range, by date then store")
 
 class Recipe(BaseModel):
     title: str = Field(..., description="Title of the recipe")
@@ -56,6 +94,16 @@ class MCPRequest(BaseModel):
 class MCPResponse(BaseModel):
     data: SearchResponse
 
+class MCPBatchRequest(BaseModel):
+    requests: List[MCPRequest] = Field(..., description="The queries to run, answered in the same order")
+
+class MCPBatchItem(BaseModel):
+    data: Optional[SearchResponse] = Field(None, description="The response, unless this query failed")
+    error: Optional[str] = Field(None, description="Why this query failed")
+
+class MCPBatchResponse(BaseModel):
+    results: List[MCPBatchItem]
+
 class ToolInputSchema(BaseModel):
     type: str = "object"
     properties: Dict[str, Any] = Field(..., description="Schema for individual parameters")
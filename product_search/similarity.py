@@ -0,0 +1,223 @@
+import os
+import threading
+import numpy as np
+import scipy.sparse as sp
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+from .index import NameIndex, PostingIndex
+
+# Weights for the optional boosts added on top of the cosine similarity of names
+BRAND_BOOST = 0.05
+AISLE_BOOST = 0.1
+PRICE_BOOST = 0.1
+
+# Aisle value used in the CSV when the aisle is unknown; it says nothing about similarity
+UNKNOWN_AISLE = "Not Available"
+
+# Minimum number of ranked neighbours computed and cached per product; deeper pages extend it
+CACHE_DEPTH = 50
+
+# Weight of whole-word tokens relative to character trigrams in the name vectors, so names sharing
+# a word rank above names that only share letters ("Chickpeas" is closer to "Green Peas" than "Chicken Broth")
+TOKEN_WEIGHT = 3.0
+
+# Most posting entries gathered per lookup, as a share of the catalog and in total: the product's
+# rarest trigrams and tokens are taken until their posting lists add up to this, and only the rows
+# in them are scored. Never fewer than enough for a cached ranking, so small catalogs are scored in full
+CANDIDATE_FRACTION = 0.05
+CANDIDATE_POSTINGS = int(os.getenv("SIMILARITY_CANDIDATE_POSTINGS", "20000"))
+MIN_CANDIDATE_POSTINGS = 2 * CACHE_DEPTH
+
+
+def tfidf_block(index: PostingIndex, n_rows: int) -> sp.csr_matrix:
+    """
+    Turns an inverted index into a row-per-product TF-IDF matrix.
+
+    The CSR posting arrays are exactly the CSC layout of the binary
+    product-by-key matrix, so no per-row work is needed to build it.
+    """
+    n_keys = len(index)
+    doc_freq = np.diff(index.offsets)
+    idf = np.log((1 + n_rows) / (1 + doc_freq)) + 1.0
+    data = np.repeat(idf, doc_freq).astype(np.float32)
+    return sp.csc_matrix((data, index.postings, index.offsets), shape=(n_rows, n_keys)).tocsr()
+
+
+def l2_normalize(matrix: sp.csr_matrix) -> sp.csr_matrix:
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    return sp.diags(1.0 / norms).dot(matrix).tocsr()
+
+
+def name_vectors(index: NameIndex) -> sp.csr_matrix:
+    """
+    Returns the L2-normalized TF-IDF trigram and token vectors of every name,
+    with tokens weighted TOKEN_WEIGHT times the trigrams.
+    """
+    n_rows = len(index)
+    return l2_normalize(sp.hstack([
+        tfidf_block(index.trigrams, n_rows),
+        tfidf_block(index.tokens, n_rows) * TOKEN_WEIGHT,
+    ]).tocsr())
+
+
+class SimilarityEngine:
+    """
+    Precomputed name vectors with top-k cosine search.
+
+    Names are represented by TF-IDF weighted character trigrams and word
+    tokens taken straight from the NameIndex postings, with tokens weighted
+    above trigrams. Only candidate rows sharing one of the product's rarer
+    trigrams or tokens are scored, with one sparse matrix-vector product
+    over those rows; brand, aisle and price proximity can be added as small
+    boosts. Ranked neighbours are cached per product.
+    """
+
+    def __init__(self, index: NameIndex, brands, aisles, prices, cache_size: int = 1024,
+                 vectors: sp.csr_matrix = None, log_prices: np.ndarray = None,
+                 candidate_postings: int = CANDIDATE_POSTINGS):
+        self.index = index
+        self.vectors = vectors if vectors is not None else name_vectors(index)
+        # Vector columns are the trigram keys followed by the token keys, so their posting list sizes line up
+        self.doc_freq = np.concatenate([np.diff(index.trigrams.offsets), np.diff(index.tokens.offsets)])
+        self.candidate_postings = min(candidate_postings,
+                                      max(MIN_CANDIDATE_POSTINGS, int(CANDIDATE_FRACTION * len(index))))
+        # Brands and aisles are compared by their dictionary codes (see catalog.CategoryColumn)
+        self.brands = brands.codes
+        self.aisles = aisles.codes
+        self.unknown_aisle = aisles.values.index(UNKNOWN_AISLE) if UNKNOWN_AISLE in aisles.values else -1
+        if log_prices is None:
+            log_prices = np.log(np.clip(np.asarray(prices, dtype=np.float64), 0.01, None))
+        self.log_prices = log_prices
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.index)
+
+    def resolve(self, product_name: str, score_cutoff: int = 75) -> Optional[int]:
+        """
+        Finds the row for a product name: an exact (case-insensitive) match if
+        there is one, otherwise the best fuzzy match.
+        """
+        name = product_name.strip().lower()
+        if not name:
+            return None
+        row = self.index.find(name)
+        if row is not None:
+            return row
+        matches = self.index.fuzzy_search(name, limit=1, score_cutoff=score_cutoff)
+        return matches[0][0] if matches else None
+
+    def postings(self, key: int) -> np.ndarray:
+        # The rows holding vector column `key`
+        n_trigrams = len(self.index.trigrams)
+        index = self.index.trigrams if key < n_trigrams else self.index.tokens
+        slot = key if key < n_trigrams else key - n_trigrams
+        return index.postings[index.offsets[slot]:index.offsets[slot + 1]]
+
+    def candidates(self, row: int) -> np.ndarray:
+        """
+        Returns the sorted rows sharing one of the product's rarer tokens or
+        trigrams. Keys are taken tokens first, each rarest first, skipping any
+        whose posting list no longer fits in `candidate_postings` entries (the
+        first key is always taken), so a common trigram such as "chi" does not
+        pull in most of the catalog. Rows sharing only common keys would score
+        low anyway.
+        """
+        start, end = self.vectors.indptr[row], self.vectors.indptr[row + 1]
+        keys = np.asarray(self.vectors.indices[start:end])
+        if len(keys) == 0:
+            return np.asarray([row])
+        doc_freq = self.doc_freq[keys]
+        budget = self.candidate_postings
+        lists = []
+        for i in np.lexsort((doc_freq, keys < len(self.index.trigrams))).tolist():
+            if lists and doc_freq[i] > budget:
+                continue
+            lists.append(self.postings(int(keys[i])))
+            budget -= doc_freq[i]
+        return np.unique(np.concatenate(lists))
+
+    def scores(self, row: int, boosts: bool = True) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the candidate rows for `row` and their similarity scores.
+        """
+        rows = self.candidates(row)
+        scores = self.vectors[rows].dot(self.vectors[row].T).toarray().ravel()
+        if boosts:
+            scores += BRAND_BOOST * (self.brands[rows] == self.brands[row])
+            if self.aisles[row] != self.unknown_aisle:
+                scores += AISLE_BOOST * (self.aisles[rows] == self.aisles[row])
+            scores += PRICE_BOOST * np.exp(-np.abs(self.log_prices[rows] - self.log_prices[row]))
+        return rows, scores
+
+    def neighbours(self, row: int, boosts: bool = True, depth: int = CACHE_DEPTH) -> List[Tuple[int, float]]:
+        """
+        Returns up to `depth` (row, score) pairs most similar to `row`, best
+        first, with one row per distinct name and the product itself excluded.
+        Ties are broken by row id, so deeper rankings extend shallower ones and
+        pages cut from them line up.
+        """
+        key = (row, boosts)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+        if cached is not None:
+            cached_depth, result = cached
+            # A ranking shorter than its depth already holds every distinct name
+            if depth <= cached_depth or len(result) < cached_depth:
+                return result[:depth]
+            depth = max(depth, cached_depth * 2)
+
+        depth = max(depth, CACHE_DEPTH)
+        result = self._rank(row, boosts, depth)
+
+        with self._lock:
+            self._cache[key] = (depth, result)
+            self._cache.move_to_end(key)
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+    def _rank(self, row: int, boosts: bool, depth: int) -> List[Tuple[int, float]]:
+        rows, scores = self.scores(row, boosts)
+        names = self.index.names
+        own_name = names[row]
+        n_rows = len(scores)
+        if n_rows == 0:
+            return []
+
+        # Names repeat across stores, so widen the partial sort until enough distinct names are found
+        width = min(n_rows, depth * 8)
+        while True:
+            if width < n_rows:
+                # Keep every row tied with the width-th best score, so the order below is exact
+                threshold = -np.partition(-scores, width - 1)[width - 1]
+                top = np.flatnonzero(scores >= threshold)
+            else:
+                top = np.arange(n_rows)
+            # Candidate rows are sorted, so ordering by position breaks ties by row id
+            top = top[np.lexsort((top, -scores[top]))]
+            seen = {own_name}
+            result = []
+            for i in top.tolist():
+                candidate = int(rows[i])
+                name = names[candidate]
+                if name in seen:
+                    continue
+                seen.add(name)
+                result.append((candidate, float(scores[i])))
+                if len(result) >= depth:
+                    return result
+            if width >= n_rows:
+                return result
+            width = min(n_rows, width * 4)
+
+    def similar(self, product_name: str, limit: int = 10, boosts: bool = True) -> List[Tuple[int, float]]:
+        row = self.resolve(product_name)
+        if row is None:
+            return []
+        return self.neighbours(row, boosts, depth=limit)[:limit]
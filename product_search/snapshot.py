@@ -0,0 +1,280 @@
+import os
+import json
+import fcntl
+import shutil
+import tempfile
+import numpy as np
+import scipy.sparse as sp
+from contextlib import contextmanager
+from typing import Optional
+from .catalog import (Catalog, CategoryColumn, CATALOG_LAYOUT, CATEGORY_COLUMNS, SNAPSHOT_DIR, file_digest,
+                      load_catalog, product_links)
+from .filters import SORT_KEYS, FilterEngine, SortedIndex
+from .index import NameIndex, PostingIndex
+from .metrics import catalog_load_seconds, timed
+from .similarity import SimilarityEngine
+
+FORMAT_VERSION = 3
+
+# Snapshot versions kept on disk; older ones are removed once a new one is published
+KEEP_SNAPSHOTS = int(os.getenv("PRODUCT_SNAPSHOT_KEEP", "2"))
+
+# Narrow integer types for the numeric columns; prices stay float64 so they serialize exactly
+NUMERIC_DTYPES = {"date": "int32", "store_id": "int32", "price": "float64", "unit_price": "float64"}
+
+
+def _save_postings(directory: str, name: str, index: PostingIndex):
+    with open(os.path.join(directory, f"{name}.keys.json"), "w") as f:
+        json.dump(index.keys, f)
+    np.save(os.path.join(directory, f"{name}.offsets.npy"), np.asarray(index.offsets, dtype=np.int64))
+    np.save(os.path.join(directory, f"{name}.postings.npy"), np.asarray(index.postings, dtype=np.int32))
+
+
+def _load_postings(directory: str, name: str) -> PostingIndex:
+    with open(os.path.join(directory, f"{name}.keys.json")) as f:
+        keys = json.load(f)
+    offsets = np.load(os.path.join(directory, f"{name}.offsets.npy"), mmap_mode="r")
+    postings = np.load(os.path.join(directory, f"{name}.postings.npy"), mmap_mode="r")
+    return PostingIndex(keys, offsets, postings)
+
+
+def write_snapshot(catalog: Catalog, snapshot_dir: str = SNAPSHOT_DIR) -> str:
+    """
+    Writes the catalog as a columnar snapshot and makes it current.
+
+    Numeric columns are stored as narrow arrays and string columns as
+    dictionary codes plus their distinct values, next to the prebuilt name
+    index postings, similarity vectors and sorted price indexes. Each snapshot lives in its own version directory and the
+    CURRENT pointer is swapped atomically, so readers never see a partial one.
+    Returns the snapshot's directory.
+    """
+    os.makedirs(snapshot_dir, exist_ok=True)
+    target = os.path.join(snapshot_dir, catalog.version)
+    if os.path.exists(os.path.join(target, "manifest.json")):
+        _set_current(snapshot_dir, catalog.version)
+        return target
+
+    staging = tempfile.mkdtemp(prefix=f".{catalog.version}-", dir=snapshot_dir)
+    try:
+        columns = catalog.columns
+        for col, dtype in NUMERIC_DTYPES.items():
+            np.save(os.path.join(staging, f"{col}.npy"), np.asarray(columns[col]).astype(dtype))
+
+        categories = {}
+        for col in CATEGORY_COLUMNS:
+            column = columns[col]
+            categories[col] = len(column.values)
+            np.save(os.path.join(staging, f"{col}.codes.npy"), column.codes.astype(np.int32))
+            with open(os.path.join(staging, f"{col}.categories.json"), "w") as f:
+                json.dump([str(value) for value in column.values], f)
+
+        _save_postings(staging, "trigrams", catalog.index.trigrams)
+        _save_postings(staging, "tokens", catalog.index.tokens)
+
+        similarity = catalog.similarity
+        for part in ("data", "indices", "indptr"):
+            np.save(os.path.join(staging, f"similarity.{part}.npy"), getattr(similarity.vectors, part))
+        np.save(os.path.join(staging, "similarity.log_prices.npy"), np.asarray(similarity.log_prices))
+
+        for key, index in catalog.filters.sorted.items():
+            np.save(os.path.join(staging, f"{key}.order.npy"), np.asarray(index.order))
+            np.save(os.path.join(staging, f"{key}.sorted.npy"), np.asarray(index.values))
+
+        source = catalog.path
+        manifest = {
+            "format": FORMAT_VERSION,
+            "version": catalog.version,
+            "layout": CATALOG_LAYOUT,
+            "rows": len(catalog),
+            "categories": categories,
+            "source": {
+                "path": source,
+                "size": os.path.getsize(source) if source and os.path.exists(source) else None,
+                "mtime": catalog.mtime,
+            },
+        }
+        # The manifest is written last; a directory without one is incomplete
+        with open(os.path.join(staging, "manifest.json"), "w") as f:
+            json.dump(manifest, f, indent=2)
+
+        os.chmod(staging, 0o755)
+        os.rename(staging, target)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    _set_current(snapshot_dir, catalog.version)
+    return target
+
+
+def _set_current(snapshot_dir: str, version: str):
+    pointer = os.path.join(snapshot_dir, "CURRENT")
+    staging = f"{pointer}.{os.getpid()}.tmp"
+    with open(staging, "w") as f:
+        f.write(version)
+    os.replace(staging, pointer)
+
+
+def current_version(snapshot_dir: str = SNAPSHOT_DIR) -> Optional[str]:
+    try:
+        with open(os.path.join(snapshot_dir, "CURRENT")) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def read_manifest(directory: str) -> Optional[dict]:
+    try:
+        with open(os.path.join(directory, "manifest.json")) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return None
+    return manifest if manifest.get("format") == FORMAT_VERSION else None
+
+
+@timed("load_snapshot", catalog_load_seconds, source="snapshot")
+def load_snapshot(directory: str) -> Catalog:
+    """
+    Memory-maps a snapshot directory into a Catalog.
+
+    Every per-row array (columns, postings, similarity vectors) stays backed
+    by the snapshot files, so processes attaching the same snapshot share one
+    copy of it in the page cache; only the distinct string values are loaded
+    into each process.
+    """
+    manifest = read_manifest(directory)
+    if manifest is None:
+        raise ValueError(f"No usable snapshot in {directory}")
+
+    def mapped(name: str) -> np.ndarray:
+        return np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+
+    columns = {col: mapped(col) for col in NUMERIC_DTYPES}
+    for col in CATEGORY_COLUMNS:
+        with open(os.path.join(directory, f"{col}.categories.json")) as f:
+            columns[col] = CategoryColumn(mapped(f"{col}.codes"), json.load(f))
+
+    columns["product_link"] = product_links(columns["code"])
+
+    name = columns["name"]
+    names = CategoryColumn(name.codes, [value.lower() for value in name.values])
+    index = NameIndex.from_parts(names, _load_postings(directory, "trigrams"), _load_postings(directory, "tokens"))
+
+    vectors = sp.csr_matrix(
+        (mapped("similarity.data"), mapped("similarity.indices"), mapped("similarity.indptr")),
+        shape=(manifest["rows"], len(index.trigrams) + len(index.tokens)), copy=False)
+    similarity = SimilarityEngine(index, columns["brand"], columns["aisle"], columns["price"],
+                                  vectors=vectors, log_prices=mapped("similarity.log_prices"))
+    filters = FilterEngine(columns, index, sorted_indexes={
+        key: SortedIndex(mapped(f"{key}.order"), mapped(f"{key}.sorted")) for key in SORT_KEYS
+    })
+
+    source = manifest["source"]
+    return Catalog(columns, version=manifest["version"], path=source["path"], mtime=source["mtime"],
+                   index=index, similarity=similarity, filters=filters)
+
+
+def load_current_snapshot(csv_path: str, snapshot_dir: str = SNAPSHOT_DIR) -> Optional[Catalog]:
+    """
+    Loads the current snapshot if it was built from the CSV as it is now,
+    or returns None so the caller can fall back to parsing the CSV.
+    """
+    version = current_version(snapshot_dir)
+    if version is None:
+        return None
+
+    directory = os.path.join(snapshot_dir, version)
+    manifest = read_manifest(directory)
+    if manifest is None:
+        return None
+
+    if manifest.get("layout") != CATALOG_LAYOUT:
+        # Built by code that lays the catalog out differently; the CSV may not have changed
+        print(f"Snapshot {version} was built with a different catalog layout")
+        return None
+
+    if os.path.exists(csv_path):
+        source = manifest["source"]
+        unchanged = source["size"] == os.path.getsize(csv_path) and source["mtime"] == os.path.getmtime(csv_path)
+        # Size and mtime avoid hashing the CSV on the common path; fall back to the content hash
+        if not unchanged and file_digest(csv_path) != manifest["version"]:
+            print(f"Snapshot {version} is stale for {csv_path}")
+            return None
+
+    catalog = load_snapshot(directory)
+    print(f"Loaded {len(catalog)} products from snapshot (version {version})")
+    return catalog
+
+
+@contextmanager
+def build_lock(snapshot_dir: str = SNAPSHOT_DIR, blocking: bool = True):
+    """
+    Holds the snapshot directory's build lock, shared by every worker process.
+    Yields False without waiting if `blocking` is False and the lock is taken.
+    """
+    os.makedirs(snapshot_dir, exist_ok=True)
+    with open(os.path.join(snapshot_dir, ".lock"), "a") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def attach_catalog(csv_path: str, snapshot_dir: str = SNAPSHOT_DIR, wait: bool = True) -> Optional[Catalog]:
+    """
+    Returns the catalog for the CSV, attached from the shared snapshot.
+
+    If no up-to-date snapshot exists, the first process to take the build lock
+    parses the CSV and publishes one while the others wait on the lock and
+    then map the same files, so the data is loaded once and held once in
+    memory however many workers there are. Returns None if `wait` is False
+    and another process is building.
+    """
+    catalog = load_current_snapshot(csv_path, snapshot_dir)
+    if catalog is not None:
+        return catalog
+    if not os.path.exists(csv_path):
+        return load_catalog(csv_path)
+
+    with build_lock(snapshot_dir, blocking=wait) as acquired:
+        if not acquired:
+            return None
+        # Another process may have published it while we waited for the lock
+        catalog = load_current_snapshot(csv_path, snapshot_dir)
+        if catalog is not None:
+            return catalog
+        directory = write_snapshot(load_catalog(csv_path), snapshot_dir)
+        prune_snapshots(snapshot_dir)
+
+    catalog = load_snapshot(directory)
+    print(f"Published snapshot {catalog.version} to {snapshot_dir}")
+    return catalog
+
+
+def prune_snapshots(snapshot_dir: str = SNAPSHOT_DIR, keep: int = KEEP_SNAPSHOTS):
+    """
+    Removes all but the `keep` newest snapshot versions, never the current one,
+    and leftover staging directories. Call with the build lock held.
+
+    Processes still mapping a removed snapshot keep reading it until they
+    switch; the files are only freed once the last mapping is closed.
+    """
+    current = current_version(snapshot_dir)
+    versions = []
+    for name in os.listdir(snapshot_dir):
+        path = os.path.join(snapshot_dir, name)
+        if not os.path.isdir(path):
+            continue
+        if name.startswith("."):
+            # Staging directory of an interrupted build; builds only run under the lock
+            shutil.rmtree(path, ignore_errors=True)
+        elif name != current:
+            versions.append((os.path.getmtime(path), path))
+
+    for _, path in sorted(versions, reverse=True)[max(keep - 1, 0):]:
+        shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,168 @@
+import os
+import asyncio
+import inspect
+from typing import Any, Dict, List, Optional
+from .metrics import span, tool_seconds
+from .pagination import CursorError
+from .schema import ToolDefinition
+from .tools import tool_definitions, tool_functions
+
+# Largest JSON-RPC batch accepted by /tools/call, and how many of its calls may run at once
+TOOL_CALL_MAX_BATCH = int(os.getenv("TOOL_CALL_MAX_BATCH", "100"))
+TOOL_CALL_CONCURRENCY = int(os.getenv("TOOL_CALL_CONCURRENCY", "8"))
+
+# JSON-RPC 2.0 error codes
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+
+# JSON schema types of the tool input schemas and the Python values they accept
+JSON_TYPES = {"string": str, "integer": int, "number": (int, float), "boolean": bool, "array": list, "object": dict}
+
+definitions = {definition.name: definition for definition in tool_definitions}
+
+
+class ToolCallError(ValueError):
+    """
+    Raised for a tool call that cannot run: arguments that do not match the
+    tool's input schema, or (as UnknownToolError) a tool that does not exist.
+    """
+
+
+class UnknownToolError(ToolCallError):
+    pass
+
+
+def _check_value(value: Any, schema: Dict[str, Any], path: str):
+    expected = schema.get("type")
+    if expected in JSON_TYPES:
+        # bool is an int in Python but not a JSON number
+        if not isinstance(value, JSON_TYPES[expected]) or (isinstance(value, bool) and expected != "boolean"):
+            raise ToolCallError(f"'{path}' must be of type {expected}")
+    if "enum" in schema and value not in schema["enum"]:
+        raise ToolCallError(f"'{path}' must be one of {', '.join(map(str, schema['enum']))}")
+    if expected == "array" and "items" in schema:
+        for i, item in enumerate(value):
+            _check_value(item, schema["items"], f"{path}[{i}]")
+
+
+def validate_arguments(definition: ToolDefinition, arguments: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Checks call arguments against the tool's input schema: required and
+    unknown parameters, types, enums and array items. An optional parameter
+    given as null is treated as omitted.
+    """
+    if arguments is None:
+        arguments = {}
+    if not isinstance(arguments, dict):
+        raise ToolCallError("Tool arguments must be an object")
+
+    schema = definition.input_schema
+    missing = [name for name in schema.required if arguments.get(name) is None]
+    if missing:
+        raise ToolCallError(f"Missing required argument(s): {', '.join(missing)}")
+    unknown = [name for name in arguments if name not in schema.properties]
+    if unknown:
+        raise ToolCallError(f"Unknown argument(s) for {definition.name}: {', '.join(unknown)}")
+
+    for name, value in arguments.items():
+        if value is not None:
+            _check_value(value, schema.properties[name], name)
+    return {name: value for name, value in arguments.items() if value is not None}
+
+
+async def call_tool(name: str, arguments: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Validates the arguments and runs the tool directly, without the agent.
+    Returns the tool's JSON string output.
+    """
+    definition = definitions.get(name)
+    if definition is None:
+        raise UnknownToolError(f"Unknown tool: {name}")
+    arguments = validate_arguments(definition, arguments)
+
+    function = tool_functions[name]
+    with span(name, tool_seconds, tool=name, outcome="error") as tool_span:
+        try:
+            if inspect.iscoroutinefunction(function):
+                result = await function(**arguments)
+            else:
+                result = await asyncio.to_thread(function, **arguments)
+        except CursorError as e:
+            raise ToolCallError(str(e))
+        tool_span.set(outcome="ok")
+    return result
+
+
+def mcp_tool(definition: ToolDefinition) -> Dict[str, Any]:
+    # The MCP spelling of a tool definition
+    return {"name": definition.name, "description": definition.description,
+            "inputSchema": definition.input_schema.dict()}
+
+
+def rpc_error(id: Any, code: int, message: str) -> Dict[str, Any]:
+    return {"jsonrpc": "2.0", "id": id, "error": {"code": code, "message": message}}
+
+
+async def handle_message(message: Any) -> Optional[Dict[str, Any]]:
+    """
+    Answers one JSON-RPC 2.0 request for the `tools/list` or `tools/call`
+    method. Returns None for a notification (a request without an id), even
+    when it fails, as JSON-RPC never answers notifications. A message that
+    is not a valid request object at all is answered with Invalid Request.
+
+    Unknown tools and invalid arguments are JSON-RPC errors; a tool that
+    fails while running answers with `isError: true`, as MCP specifies.
+    """
+    if not isinstance(message, dict) or message.get("jsonrpc") != "2.0" or not isinstance(message.get("method"), str):
+        return rpc_error(message.get("id") if isinstance(message, dict) else None, INVALID_REQUEST, "Invalid Request")
+
+    response = await _answer(message)
+    if "id" not in message:
+        return None
+    return response
+
+
+async def _answer(message: Dict[str, Any]) -> Dict[str, Any]:
+    id = message.get("id")
+    method = message["method"]
+    params = message.get("params") or {}
+
+    if method == "tools/list":
+        result = {"tools": [mcp_tool(definition) for definition in tool_definitions]}
+    elif method == "tools/call":
+        if not isinstance(params, dict) or not isinstance(params.get("name"), str):
+            return rpc_error(id, INVALID_PARAMS, "params must be an object with the tool 'name'")
+        name = params["name"]
+        try:
+            text = await call_tool(name, params.get("arguments"))
+            result = {"content": [{"type": "text", "text": text}], "isError": False}
+        except ToolCallError as e:
+            return rpc_error(id, INVALID_PARAMS, str(e))
+        except Exception as e:
+            print(f"Error running tool {name}: {e}")
+            result = {"content": [{"type": "text", "text": f"Error running {name}: {e}"}], "isError": True}
+    else:
+        return rpc_error(id, METHOD_NOT_FOUND, f"Method not found: {method}")
+
+    return {"jsonrpc": "2.0", "id": id, "result": result}
+
+
+async def handle_batch(messages: List[Any]) -> List[Dict[str, Any]]:
+    """
+    Answers a JSON-RPC batch. Calls run concurrently, bounded so one batch
+    cannot flood the thread pool or the LLM; responses keep request order
+    and leave out notifications, including failed ones.
+    """
+    if not messages:
+        return [rpc_error(None, INVALID_REQUEST, "Invalid Request")]
+
+    semaphore = asyncio.Semaphore(TOOL_CALL_CONCURRENCY)
+
+    async def answer(message: Any) -> Optional[Dict[str, Any]]:
+        async with semaphore:
+            return await handle_message(message)
+
+    responses = await asyncio.gather(*(answer(message) for message in messages))
+    return [response for response in responses if response is not None]
@@ -1,154 +1,371 @@
 import os
 import json
-import pandas as pd
-from typing import List
-from langchain_openai import ChatOpenAI
-from .schema import Product, Recipe, NutritionalInfo, ToolDefinition, ToolInputSchema, ProductResponse
+import bisect
+from typing import List, Optional, Tuple
+from .schema import (Recipe, NutritionalInfo, ToolDefinition, ToolInputSchema, PricePoint, LatestPriceResponse,
+                     CheapestStoresResponse, PriceHistoryResponse)
+from .cache import cached_results, make_tiered_cache, make_key, MISSING
+from .results import ProductResults
+from .concurrency import SingleFlight
+from .llm import chat_model
+from .pagination import MAX_PAGE_SIZE, CursorError, decode_cursor, encode_cursor, query_digest
 
-# Initialize the OpenAI model for recipe generation
-llm = ChatOpenAI(temperature=0, model="gpt-4")
+# The catalog and price store modules are imported on first use rather than with the tools,
+# so importing the tools (and the agent graph built on them) does not load pandas with them
 
-def get_products(query: str) -> str:
-    """
-    Searches for products in the CSV file based on a query and returns the results as a JSON string.
+def get_catalog():
+    from . import catalog
+    return catalog.get_catalog()
+
+def get_price_store():
+    from . import prices
+    return prices.get_price_store()
+
+def recipe_llm():
+    # The OpenAI model for recipe generation, created on first use
+    return chat_model("recipe", temperature=0, model="gpt-4")
+
+# Recipes are deterministic (temperature=0) given the ingredient set, so they are
+# memoized in a bounded in-memory LRU, backed by a persistent SQLite store (opened
+# on first use) when CACHE_BACKEND=sqlite
+recipe_cache = make_tiered_cache(
+    "recipes",
+    maxsize=int(os.getenv("RECIPE_CACHE_SIZE", "512")),
+    ttl=float(os.getenv("RECIPE_CACHE_TTL", str(30 * 24 * 3600))),
+    store_maxsize=int(os.getenv("RECIPE_STORE_SIZE", "100000")),
+)
+
+# Concurrent requests for the same ingredients share one in-flight LLM call
+recipe_calls = SingleFlight()
+
+@cached_results
+def search_products(query: str, with_links: bool = False, limit: int = 10, cursor: Optional[str] = None,
+                    catalog=None) -> ProductResults:
     """
-    # Correctly locate the CSV file in the root directory
-    # csv_path = os.path.join(os.path.dirname(__file__), '..', '..', 'noname_products.csv')
-    csv_path = '/app/CSVs/noname_products.csv'
+    Searches for products whose name contains the query and returns structured results.
 
-    # Fixed f-string syntax
-    print(f"Searching for product: {query}")
-    
-    if not os.path.exists(csv_path):
-        print(f"CSV file not found at: {csv_path}")
-        return json.dumps([])
+    Results are in catalog order, one page of `limit` at a time. The cursor
+    holds the last row id returned, so the next page resumes right after it
+    instead of re-matching and skipping the earlier pages. Raises CursorError
+    for a cursor from another query or an older catalog.
+    """
+    digest = query_digest("products", query.lower())
+    after = decode_cursor(cursor, catalog.version, digest)
+    if after is not None and not isinstance(after, int):
+        raise CursorError("Malformed cursor")
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
 
     try:
-        df = pd.read_csv(csv_path, dtype={'Article Number': str, 'Code': str})
-        print(f"Loaded {len(df)} products from CSV")
-        
-        # Use case-insensitive search directly on the 'Name' column, after stripping whitespace
-        matched_df = df[df['Name'].str.strip().str.contains(query, case=False, na=False)].copy()
-        
-        print(f"Found {len(matched_df)} matching products")
+        # The name index answers the case-insensitive substring match without scanning every row
+        rows = catalog.index.search(query, limit=limit + 1, after=after)
+        next_cursor = encode_cursor(catalog.version, digest, rows[limit - 1]) if len(rows) > limit else None
+        return ProductResults(catalog, rows[:limit], with_links=with_links, next_cursor=next_cursor)
 
-        # Limit the number of products to avoid exceeding the context length
-        matched_df = matched_df.head(10)
-        
-        if matched_df.empty:
-            return json.dumps([])
-
-        # Rename columns to be valid Python identifiers
-        matched_df.columns = [col.lower().replace(' ', '_').replace('-', '_') for col in matched_df.columns]
-        
-        products = [Product(**record) for record in matched_df.to_dict('records')]
-        response_products = [ProductResponse(**p.dict()) for p in products]
-        
-        # Serialize the list of products to a JSON string
-        return json.dumps([p.dict() for p in response_products])
-        
     except Exception as e:
-        print(f"Error processing CSV: {e}")
-        return json.dumps([])
+        print(f"Error searching catalog: {e}")
+        return ProductResults(catalog, [])
 
-def get_similar_products(product_name: str) -> str:
+def search_products_many(queries: List[str], with_links: bool = False, limit: int = 10) -> List[ProductResults]:
     """
-    Finds products with names similar to the given product name and returns the results as a JSON string.
+    Runs search_products for many queries in one pass over the name index.
     """
-    csv_path = '/app/CSVs/noname_products.csv'
+    catalog = get_catalog()
+    try:
+        rows_per_query = catalog.index.search_many(queries, limit=limit)
+        return [ProductResults(catalog, rows, with_links=with_links) for rows in rows_per_query]
 
-    if not os.path.exists(csv_path):
-        print(f"CSV file not found at: {csv_path}")
-        return json.dumps([])
+    except Exception as e:
+        print(f"Error in search_products_many: {e}")
+        return [ProductResults(catalog, []) for _ in queries]
+
+@cached_results
+def search_similar_products(product_name: str, with_links: bool = False, limit: int = 10, cursor: Optional[str] = None,
+                            catalog=None) -> ProductResults:
+    """
+    Finds the products most similar to the given product name and returns structured results.
+
+    The ranking is deterministic for a catalog version (ties go to the lower
+    row id) and cached per product. The cursor holds the resolved product
+    row and an offset into its ranking, so later pages skip name resolution
+    and are sliced from the cached ranking. Raises CursorError for a cursor
+    from another query or an older catalog.
+    """
+    digest = query_digest("similar_products", product_name.strip().lower())
+    position = decode_cursor(cursor, catalog.version, digest)
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    if position is not None and (not isinstance(position, list) or len(position) != 2 or position[0] >= len(catalog)):
+        raise CursorError("Malformed cursor")
 
     try:
-        df = pd.read_csv(csv_path, dtype={'Article Number': str, 'Code': str})
-        
-        # Find the aisle of the given product, after stripping whitespace
-        product_row = df[df['Name'].str.strip() == product_name]
-        if product_row.empty:
+        # Ranked by name similarity with brand/aisle/price boosts; the name may be misspelled
+        row, offset = position if position is not None else (catalog.similarity.resolve(product_name), 0)
+        if row is None:
             print(f"Product '{product_name}' not found")
-            return json.dumps([])
-            
-        aisle = product_row.iloc[0]['aisle']
-        print(f"Found product in aisle: {aisle}")
-        
-        # Find other products in the same aisle, excluding the original product
-        similar_df = df[(df['aisle'] == aisle) & (df['Name'].str.strip() != product_name)].head(10).copy()
-
-        if similar_df.empty:
-            print(f"No similar products found in aisle: {aisle}")
-            return json.dumps([])
+            return ProductResults(catalog, [])
+        neighbours = catalog.similarity.neighbours(row, depth=offset + limit + 1)[offset:]
+        next_cursor = encode_cursor(catalog.version, digest, [row, offset + limit]) if len(neighbours) > limit else None
+        return ProductResults(catalog, [row for row, _ in neighbours[:limit]], with_links=with_links,
+                              next_cursor=next_cursor)
 
-        # Rename columns to be valid Python identifiers
-        similar_df.columns = [col.lower().replace(' ', '_').replace('-', '_') for col in similar_df.columns]
-        
-        products = [Product(**record) for record in similar_df.to_dict('records')]
-        response_products = [ProductResponse(**p.dict()) for p in products]
-        
-        # Serialize the list of products to a JSON string
-        return json.dumps([p.dict() for p in response_products])
-        
     except Exception as e:
         print(f"Error finding similar products: {e}")
-        return json.dumps([])
+        return ProductResults(catalog, [])
+
+@cached_results
+def search_products_fuzzy(query: str, score_cutoff: int = 75, limit: int = 10, catalog=None) -> ProductResults:
+    """
+    Typo-tolerant product search returning structured results ranked by match score.
+    """
+    try:
+        matches = catalog.index.fuzzy_search(query, limit=limit, score_cutoff=score_cutoff)
+        return ProductResults(catalog, [row for row, _ in matches], scores=[float(score) for _, score in matches])
+
+    except Exception as e:
+        print(f"Error in search_products_fuzzy: {e}")
+        return ProductResults(catalog, [])
+
+@cached_results
+def search_products_filtered(query: Optional[str] = None, min_price: Optional[float] = None,
+                             max_price: Optional[float] = None, min_unit_price: Optional[float] = None,
+                             max_unit_price: Optional[float] = None, brand: Optional[str] = None,
+                             aisle: Optional[str] = None, sale_type: Optional[str] = None, unit: Optional[str] = None,
+                             sort_by: Optional[str] = None, descending: bool = False, with_links: bool = False,
+                             limit: int = 10, catalog=None) -> ProductResults:
+    """
+    Structured product search: optional name match plus price / unit price
+    ranges and brand, aisle, sale type and unit filters, sorted by price or
+    unit price. Returns structured results.
+    """
+    try:
+        rows = catalog.filters.search(
+            query, min_price=min_price, max_price=max_price, min_unit_price=min_unit_price,
+            max_unit_price=max_unit_price, brand=brand, aisle=aisle, sale_type=sale_type, unit=unit,
+            sort_by=sort_by, descending=descending, limit=limit,
+        )
+        return ProductResults(catalog, rows, with_links=with_links)
+
+    except Exception as e:
+        print(f"Error in search_products_filtered: {e}")
+        return ProductResults(catalog, [])
+
+def get_products(query: str, cursor: Optional[str] = None) -> str:
+    """
+    Searches for products in the catalog based on a query and returns one page of results as a JSON string:
+    {"products": [...], "next_cursor": ...}. Pass next_cursor back to get the next page.
+    """
+    # Limit the number of products to avoid exceeding the context length
+    return search_products(query, limit=10, cursor=cursor).page_json()
+
+def get_similar_products(product_name: str, cursor: Optional[str] = None) -> str:
+    """
+    Finds products with names similar to the given product name and returns one page of results as a JSON string.
+    """
+    return search_similar_products(product_name, limit=10, cursor=cursor).page_json()
+
+def get_products_fuzzy(query: str, score_cutoff: int = 75) -> str:
+    """
+    Typo-tolerant product search. Returns products ranked by fuzzy match score as a JSON string.
+    """
+    return search_products_fuzzy(query, score_cutoff, limit=10).json()
+
+def get_products_filtered(query: Optional[str] = None, min_price: Optional[float] = None,
+                          max_price: Optional[float] = None, min_unit_price: Optional[float] = None,
+                          max_unit_price: Optional[float] = None, brand: Optional[str] = None,
+                          aisle: Optional[str] = None, sale_type: Optional[str] = None, unit: Optional[str] = None,
+                          sort_by: Optional[str] = None, descending: bool = False) -> str:
+    """
+    Filters and sorts products by price, unit price, brand, aisle and sale type. Returns the results as a JSON string.
+    """
+    return search_products_filtered(
+        query, min_price=min_price, max_price=max_price, min_unit_price=min_unit_price, max_unit_price=max_unit_price,
+        brand=brand, aisle=aisle, sale_type=sale_type, unit=unit, sort_by=sort_by, descending=descending, limit=10,
+    ).json()
+
+def resolve_product(product: str, catalog=None) -> Optional[Tuple[str, Optional[str]]]:
+    """
+    Returns the (code, name) of a product given by its code (e.g. 21541429_EA)
+    or by a possibly misspelled name. The name is None for a code that is only
+    in the price history.
+    """
+    catalog = catalog or get_catalog()
+    text = product.strip()
+    if not text:
+        return None
+    # Code values are sorted, so an exact code is a binary search away
+    code = catalog.columns['code']
+    i = bisect.bisect_left(code.values, text)
+    if i < len(code.values) and code.values[i] == text:
+        row = int(catalog.code_rows[i])
+        return text, catalog.columns['name'][row]
+    if text in get_price_store():
+        return text, None
+    row = catalog.similarity.resolve(text)
+    if row is None:
+        return None
+    return code[row], catalog.columns['name'][row]
+
+def latest_price(product: str, store_id: int) -> Optional[LatestPriceResponse]:
+    """
+    The most recent price of a product at a store, or None for an unknown product.
+    """
+    resolved = resolve_product(product)
+    if resolved is None:
+        return None
+    code, name = resolved
+    point = get_price_store().latest(code, store_id)
+    return LatestPriceResponse(code=code, name=name, store_id=store_id, latest=PricePoint(**point) if point else None)
+
+def cheapest_stores(product: str, as_of: Optional[int] = None, limit: int = 5) -> Optional[CheapestStoresResponse]:
+    """
+    The stores selling a product for the least, by each store's latest price
+    on or before `as_of`, or None for an unknown product.
+    """
+    resolved = resolve_product(product)
+    if resolved is None:
+        return None
+    code, name = resolved
+    points = get_price_store().cheapest(code, as_of=as_of, limit=max(1, min(limit, MAX_PAGE_SIZE)))
+    return CheapestStoresResponse(code=code, name=name, as_of=as_of, stores=[PricePoint(**point) for point in points])
+
+def price_history(product: str, store_id: Optional[int] = None, start: Optional[int] = None,
+                  end: Optional[int] = None, limit: int = MAX_PAGE_SIZE) -> Optional[PriceHistoryResponse]:
+    """
+    A product's prices between two dates (YYYYMMDD, inclusive), optionally at
+    one store, with min / max / mean over the range, or None for an unknown product.
+    """
+    resolved = resolve_product(product)
+    if resolved is None:
+        return None
+    code, name = resolved
+    history = get_price_store().history(code, store_id=store_id, start=start, end=end,
+                                        limit=max(0, min(limit, MAX_PAGE_SIZE)))
+    if history is None:
+        history = {"code": code, "count": 0, "points": []}
+    history["points"] = [PricePoint(**point) for point in history["points"]]
+    return PriceHistoryResponse(name=name, store_id=store_id, **history)
+
+def get_latest_price(product: str, store_id: int) -> str:
+    """
+    Returns the most recent price of a product (name or code) at a store as a JSON string.
+    """
+    response = latest_price(product, store_id)
+    return response.json() if response else json.dumps({"response": f"Product '{product}' not found"})
+
+def get_cheapest_stores(product: str, as_of: Optional[int] = None) -> str:
+    """
+    Returns the five stores with the lowest current price for a product (name or code) as a JSON string.
+    """
+    response = cheapest_stores(product, as_of=as_of, limit=5)
+    return response.json() if response else json.dumps({"response": f"Product '{product}' not found"})
+
+def get_price_history(product: str, store_id: Optional[int] = None, start: Optional[int] = None,
+                      end: Optional[int] = None) -> str:
+    """
+    Returns a product's price history with min / max / mean over the range as a JSON string.
+    """
+    # Only the latest points are included to keep the context short; the summary covers the whole range
+    response = price_history(product, store_id=store_id, start=start, end=end, limit=30)
+    return response.json() if response else json.dumps({"response": f"Product '{product}' not found"})
+
+def canonical_ingredients(ingredients: List[str]) -> List[str]:
+    """
+    Lowercases, deduplicates and sorts ingredients so equivalent requests share a recipe.
+    """
+    return sorted({ingredient.strip().lower() for ingredient in ingredients if ingredient and ingredient.strip()})
+
+def _recipe_prompt(ingredients: List[str]) -> str:
+    return f"Create a simple recipe using the following ingredients: {', '.join(ingredients)}. Please provide a title, the list of ingredients, and the instructions."
+
+def _parse_recipe(content: str) -> Recipe:
+    # This is a simplified parser. A more robust implementation would handle errors and edge cases.
+    lines = content.strip().split('\n')
+    title = lines[0].replace('Title: ', '').replace('# ', '').strip()
+    
+    ingredient_list = []
+    instruction_text = ""
+    
+    is_ingredients = False
+    is_instructions = False
+    
+    for line in lines[1:]:
+        line_lower = line.lower()
+        if "ingredients:" in line_lower or "ingredient list:" in line_lower:
+            is_ingredients = True
+            is_instructions = False
+            continue
+        elif "instructions:" in line_lower or "directions:" in line_lower or "method:" in line_lower:
+            is_ingredients = False
+            is_instructions = True
+            continue
+            
+        if is_ingredients and line.strip():
+            # Remove common list markers
+            clean_ingredient = line.strip().lstrip('- *•').strip()
+            if clean_ingredient:
+                ingredient_list.append(clean_ingredient)
+        elif is_instructions and line.strip():
+            instruction_text += line.strip() + "\n"
+            
+    return Recipe(
+        title=title,
+        ingredients=ingredient_list,
+        instructions=instruction_text.strip()
+    )
+
+def _fallback_recipe(ingredients: List[str]) -> str:
+    fallback_recipe = Recipe(
+        title="Simple Recipe",
+        ingredients=ingredients,
+        instructions="Combine ingredients and cook as desired."
+    )
+    return fallback_recipe.json()
 
 def get_recipe(ingredients: List[str]) -> str:
     """
     Generates a recipe from a list of ingredients and returns it as a JSON string.
     In the output, have each ingredient name on a new line and quoted with double asterisks (**)
     """
+    canonical = canonical_ingredients(ingredients)
+    key = make_key(canonical)
+    cached = recipe_cache.get(key)
+    if cached is not MISSING:
+        return cached
+
+    def generate() -> str:
+        response = recipe_llm().invoke(_recipe_prompt(canonical))
+        recipe_json = _parse_recipe(response.content).json()
+        recipe_cache.set(key, recipe_json)
+        return recipe_json
+
     try:
-        prompt = f"Create a simple recipe using the following ingredients: {', '.join(ingredients)}. Please provide a title, the list of ingredients, and the instructions."
-        response = llm.invoke(prompt)
-        
-        # This is a simplified parser. A more robust implementation would handle errors and edge cases.
-        lines = response.content.strip().split('\n')
-        title = lines[0].replace('Title: ', '').replace('# ', '').strip()
-        
-        ingredient_list = []
-        instruction_text = ""
-        
-        is_ingredients = False
-        is_instructions = False
-        
-        for line in lines[1:]:
-            line_lower = line.lower()
-            if "ingredients:" in line_lower or "ingredient list:" in line_lower:
-                is_ingredients = True
-                is_instructions = False
-                continue
-            elif "instructions:" in line_lower or "directions:" in line_lower or "method:" in line_lower:
-                is_ingredients = False
-                is_instructions = True
-                continue
-                
-            if is_ingredients and line.strip():
-                # Remove common list markers
-                clean_ingredient = line.strip().lstrip('- *•').strip()
-                if clean_ingredient:
-                    ingredient_list.append(clean_ingredient)
-            elif is_instructions and line.strip():
-                instruction_text += line.strip() + "\n"
-                
-        recipe = Recipe(
-            title=title,
-            ingredients=ingredient_list,
-            instructions=instruction_text.strip()
-        )
-        
-        # Serialize the recipe to a JSON string
-        return recipe.json()
+        return recipe_calls.do(key, generate)
         
     except Exception as e:
         print(f"Error generating recipe: {e}")
-        # Return a fallback recipe
-        fallback_recipe = Recipe(
-            title="Simple Recipe",
-            ingredients=ingredients,
-            instructions="Combine ingredients and cook as desired."
-        )
-        return fallback_recipe.json()
+        return _fallback_recipe(ingredients)
+
+async def aget_recipe(ingredients: List[str]) -> str:
+    """
+    Async variant of get_recipe that does not block the event loop while waiting on the LLM.
+    """
+    canonical = canonical_ingredients(ingredients)
+    key = make_key(canonical)
+    cached = recipe_cache.get(key)
+    if cached is not MISSING:
+        return cached
+
+    async def generate() -> str:
+        response = await recipe_llm().ainvoke(_recipe_prompt(canonical))
+        recipe_json = _parse_recipe(response.content).json()
+        recipe_cache.set(key, recipe_json)
+        return recipe_json
+
+    try:
+        return await recipe_calls.ado(key, generate)
+
+    except Exception as e:
+        print(f"Error generating recipe: {e}")
+        return _fallback_recipe(ingredients)
 
 def get_nutritional_info(product_name: str) -> str:
     """
@@ -170,98 +387,109 @@ def get_nutritional_info(product_name: str) -> str:
         print(f"Error getting nutritional info: {e}")
         return json.dumps({})
 
-def get_products_with_links(query: str) -> str:
+def get_products_with_links(query: str, cursor: Optional[str] = None) -> str:
     """
-    Searches for products and includes a web link for each product.
+    Searches for products and includes a web link for each product. Returns one page of results.
     """
-    # csv_path = os.path.join(os.path.dirname(__file__), '..', '..', 'noname_products.csv')
-    csv_path = '/app/CSVs/noname_products.csv'
-    print(f"Searching for product with link: {query}")
-
-    if not os.path.exists(csv_path):
-        return json.dumps([])
-
-    try:
-        df = pd.read_csv(csv_path, dtype={'Article Number': str, 'Code': str})
-        matched_df = df[df['Name'].str.strip().str.contains(query, case=False, na=False)].copy()
-        matched_df = matched_df.head(10)
-
-        if matched_df.empty:
-            return json.dumps([])
-
-        # Add the product link
-        if 'Code' in matched_df.columns:
-            matched_df['product_link'] = matched_df['Code'].apply(lambda code: f"https://www.realcanadiansuperstore.ca/p/{code}" if pd.notna(code) else None)
-        else:
-            matched_df['product_link'] = None
+    return search_products(query, with_links=True, limit=10, cursor=cursor).page_json()
 
-        matched_df.columns = [col.lower().replace(' ', '_').replace('-', '_') for col in matched_df.columns]
-        
-        products = [Product(**record) for record in matched_df.to_dict('records')]
-        response_products = [ProductResponse(**p.dict()) for p in products]
-        return json.dumps([p.dict() for p in response_products])
-
-    except Exception as e:
-        print(f"Error in get_products_with_links: {e}")
-        return json.dumps([])
-
-def get_similar_products_with_links(product_name: str) -> str:
+def get_similar_products_with_links(product_name: str, cursor: Optional[str] = None) -> str:
     """
-    Finds similar products and includes a web link for each.
+    Finds similar products and includes a web link for each. Returns one page of results.
     """
-    csv_path = '/app/CSVs/noname_products.csv'
-
-    if not os.path.exists(csv_path):
-        return json.dumps([])
-
-    try:
-        df = pd.read_csv(csv_path, dtype={'Article Number': str, 'Code': str})
-        product_row = df[df['Name'].str.strip() == product_name]
-        if product_row.empty:
-            return json.dumps([])
-            
-        aisle = product_row.iloc[0]['aisle']
-        similar_df = df[(df['aisle'] == aisle) & (df['Name'].str.strip() != product_name)].head(10).copy()
-
-        if similar_df.empty:
-            return json.dumps([])
-
-        # Add the product link
-        if 'Code' in similar_df.columns:
-            similar_df['product_link'] = similar_df['Code'].apply(lambda code: f"https://www.realcanadiansuperstore.ca/p/{code}" if pd.notna(code) else None)
-        else:
-            similar_df['product_link'] = None
-
-        similar_df.columns = [col.lower().replace(' ', '_').replace('-', '_') for col in similar_df.columns]
-        
-        products = [Product(**record) for record in similar_df.to_dict('records')]
-        response_products = [ProductResponse(**p.dict()) for p in products]
-        return json.dumps([p.dict() for p in response_products])
-
-    except Exception as e:
-        print(f"Error in get_similar_products_with_links: {e}")
-        return json.dumps([])
+    return search_similar_products(product_name, with_links=True, limit=10, cursor=cursor).page_json()
 
 tool_definitions = [
     ToolDefinition(
         name="get_products",
-        description="Searches for products in the CSV file based on a query and returns the results as a JSON string.",
+        description="Searches for products in the catalog based on a query. Returns a page of results as a JSON string: {\"products\": [...], \"next_cursor\": ...}.",
         input_schema=ToolInputSchema(
             properties={
-                "query": {"type": "string", "description": "The product to search for"}
+                "query": {"type": "string", "description": "The product to search for"},
+                "cursor": {"type": "string", "description": "next_cursor from the previous page, to fetch the next one"},
             },
             required=["query"],
         ),
     ),
+    ToolDefinition(
+        name="get_products_fuzzy",
+        description="Typo-tolerant product search that ranks products by fuzzy match score.",
+        input_schema=ToolInputSchema(
+            properties={
+                "query": {"type": "string", "description": "The product to search for, possibly misspelled"},
+                "score_cutoff": {
+                    "type": "integer",
+                    "description": "Minimum match score from 0 to 100 (default 75)",
+                },
+            },
+            required=["query"],
+        ),
+    ),
+    ToolDefinition(
+        name="get_products_filtered",
+        description="Filters and sorts products by price, unit price (per 100 g, 100 ml or 1 ea), brand, aisle and sale type.",
+        input_schema=ToolInputSchema(
+            properties={
+                "query": {"type": "string", "description": "Text the product name must contain (optional)"},
+                "min_price": {"type": "number", "description": "Minimum price in dollars"},
+                "max_price": {"type": "number", "description": "Maximum price in dollars"},
+                "min_unit_price": {"type": "number", "description": "Minimum price per 100 g, 100 ml or 1 ea"},
+                "max_unit_price": {"type": "number", "description": "Maximum price per 100 g, 100 ml or 1 ea"},
+                "brand": {"type": "string", "description": "Brand name, or part of it"},
+                "aisle": {"type": "string", "description": "Aisle name, or part of it (e.g. Dairy)"},
+                "sale_type": {"type": "string", "description": "REGULAR or SPECIAL"},
+                "unit": {"type": "string", "enum": ["g", "kg", "ml", "l", "ea"], "description": "Only products sold by weight (g, kg), volume (ml, l) or count (ea)"},
+                "sort_by": {"type": "string", "enum": ["price", "unit_price"], "description": "Sort key (default: price, or name match order when a query is given)"},
+                "descending": {"type": "boolean", "description": "Sort from highest to lowest"},
+            },
+            required=[],
+        ),
+    ),
+    ToolDefinition(
+        name="get_latest_price",
+        description="Returns the most recent price of a product at a store.",
+        input_schema=ToolInputSchema(
+            properties={
+                "product": {"type": "string", "description": "Product name or code"},
+                "store_id": {"type": "integer", "description": "ID of the store"},
+            },
+            required=["product", "store_id"],
+        ),
+    ),
+    ToolDefinition(
+        name="get_cheapest_stores",
+        description="Returns the stores with the lowest current price for a product.",
+        input_schema=ToolInputSchema(
+            properties={
+                "product": {"type": "string", "description": "Product name or code"},
+                "as_of": {"type": "integer", "description": "Use prices as of this date (YYYYMMDD); default latest"},
+            },
+            required=["product"],
+        ),
+    ),
+    ToolDefinition(
+        name="get_price_history",
+        description="Returns a product's price history over a date range with min, max and mean price.",
+        input_schema=ToolInputSchema(
+            properties={
+                "product": {"type": "string", "description": "Product name or code"},
+                "store_id": {"type": "integer", "description": "Only prices at this store (default: all stores)"},
+                "start": {"type": "integer", "description": "First date (YYYYMMDD, inclusive)"},
+                "end": {"type": "integer", "description": "Last date (YYYYMMDD, inclusive)"},
+            },
+            required=["product"],
+        ),
+    ),
     ToolDefinition(
         name="get_similar_products",
-        description="Finds products with names similar to the given product name and returns the results as a JSON string.",
+        description="Finds the products most similar to the given (possibly misspelled) product name. Returns a page of results with a next_cursor.",
         input_schema=ToolInputSchema(
             properties={
                 "product_name": {
                     "type": "string",
                     "description": "The name of the product to find similar products for",
-                }
+                },
+                "cursor": {"type": "string", "description": "next_cursor from the previous page, to fetch the next one"},
             },
             required=["product_name"],
         ),
@@ -295,25 +523,42 @@ tool_definitions = [
     ),
     ToolDefinition(
         name="get_products_with_links",
-        description="Searches for products and provides a web link for each.",
+        description="Searches for products and provides a web link for each. Returns a page of results with a next_cursor.",
         input_schema=ToolInputSchema(
             properties={
-                "query": {"type": "string", "description": "The product to search for"}
+                "query": {"type": "string", "description": "The product to search for"},
+                "cursor": {"type": "string", "description": "next_cursor from the previous page, to fetch the next one"},
             },
             required=["query"],
         ),
     ),
     ToolDefinition(
         name="get_similar_products_with_links",
-        description="Finds similar products and provides a web link for each.",
+        description="Finds similar products and provides a web link for each. Returns a page of results with a next_cursor.",
         input_schema=ToolInputSchema(
             properties={
                 "product_name": {
                     "type": "string",
                     "description": "The name of the product to find similar products for",
-                }
+                },
+                "cursor": {"type": "string", "description": "next_cursor from the previous page, to fetch the next one"},
             },
             required=["product_name"],
         ),
     ),
-]
\ No newline at end of file
+]
+# Implementation of each advertised tool, for executing calls without the agent.
+# Coroutine functions are awaited; the rest are CPU-bound and run in a worker thread.
+tool_functions = {
+    "get_products": get_products,
+    "get_products_fuzzy": get_products_fuzzy,
+    "get_products_filtered": get_products_filtered,
+    "get_latest_price": get_latest_price,
+    "get_cheapest_stores": get_cheapest_stores,
+    "get_price_history": get_price_history,
+    "get_similar_products": get_similar_products,
+    "get_recipe": aget_recipe,
+    "get_nutritional_info": get_nutritional_info,
+    "get_products_with_links": get_products_with_links,
+    "get_similar_products_with_links": get_similar_products_with_links,
+}
@@ -0,0 +1,44 @@
+import os
+import pytest
+from product_search import catalog as catalog_module
+from product_search.catalog import CatalogManager
+
+HEADER = "Date,Store ID,Code,Article Number,Name,aisle,Brand,Package Size,Price,Unit,Sale Type\n"
+
+
+class CatalogFile:
+    """
+    A product CSV in a temporary directory, served as the current catalog.
+    """
+
+    def __init__(self, path: str, manager: CatalogManager):
+        self.path = path
+        self.manager = manager
+        self.mtime = 1_700_000_000
+
+    def write(self, products):
+        """
+        Writes one row per (code, name) or (code, name, price, package size).
+        """
+        with open(self.path, "w") as f:
+            f.write(HEADER)
+            for code, name, *rest in products:
+                price, package_size = rest or (2.0, "1 ea")
+                f.write(f"20240523,1,{code}_EA,{code},{name},Dairy,No Name,{package_size},{price},ea,REGULAR\n")
+        # Move the mtime on, so a rewrite within the same clock tick is still seen as a change
+        self.mtime += 10
+        os.utime(self.path, (self.mtime, self.mtime))
+
+    def reload(self, products):
+        self.write(products)
+        assert self.manager.refresh()
+        return self.manager.get()
+
+
+@pytest.fixture
+def catalog_file(tmp_path, monkeypatch):
+    path = str(tmp_path / "products.csv")
+    # No watcher thread and no shared snapshot: tests reload explicitly
+    manager = CatalogManager(path, interval=0, snapshot_dir="")
+    monkeypatch.setattr(catalog_module, "catalog_manager", manager)
+    return CatalogFile(path, manager)
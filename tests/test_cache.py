@@ -0,0 +1,22 @@
+from product_search.cache import tool_cache
+from product_search.tools import search_products
+
+
+def test_reload_invalidates_cached_results(catalog_file):
+    catalog_file.write([("100", "Whole Milk"), ("101", "Bread")])
+    first = search_products("milk")
+    hits = tool_cache.hits
+    assert search_products("milk").rows == first.rows
+    assert tool_cache.hits == hits + 1
+
+    catalog = catalog_file.reload([("100", "Whole Milk"), ("101", "Bread"), ("102", "Chocolate Milk")])
+    results = search_products("milk")
+    assert results.catalog is catalog
+    assert [catalog.columns["name"][row] for row in results.rows] == ["Whole Milk", "Chocolate Milk"]
+
+
+def test_cache_key_keeps_exact_arguments(catalog_file):
+    catalog_file.write([("100", "Sweet Peas"), ("101", "Pear Halves")])
+    assert len(search_products("pea")) == 2
+    # " pea" only matches where a word starts with "pea"; the cached "pea" results must not be reused
+    assert len(search_products(" pea")) == 1
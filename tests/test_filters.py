@@ -0,0 +1,31 @@
+import math
+import pandas as pd
+import pytest
+from product_search.filters import parse_package_size, unit_prices
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("500 g", (500.0, "g")),
+    ("1.36 kg", (1360.0, "g")),
+    ("1.75 l", (1750.0, "ml")),
+    ("24x120.0 ml", (2880.0, "ml")),
+    ("12 eggs", (12.0, "ea")),
+    ("1 EA", (1.0, "ea")),
+])
+def test_parse_package_size(text, expected):
+    assert parse_package_size(text) == expected
+
+
+@pytest.mark.parametrize("text", ["", "No Name", "2 lbs", "g 500", None])
+def test_unparsed_package_size_is_nan(text):
+    quantity, measure = parse_package_size(text)
+    assert math.isnan(quantity) and measure == ""
+
+
+def test_unit_prices():
+    sizes = pd.Series(["500 g", "1 l", "24x120.0 ml", "12 eggs", "500 g", "No Name", None])
+    prices = pd.Series([2.5, 3.0, 7.2, 4.2, 5.0, 1.0, 1.0])
+    values, labels = unit_prices(sizes, prices)
+    assert list(values[:5]) == [0.5, 0.3, 0.25, 0.35, 1.0]
+    assert all(math.isnan(value) for value in values[5:])
+    assert labels == ["100 g", "100 ml", "100 ml", "1 ea", "100 g", "", ""]
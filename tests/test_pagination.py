@@ -0,0 +1,57 @@
+import pytest
+from product_search.pagination import CursorError, decode_cursor, encode_cursor
+from product_search.tools import search_products, search_similar_products
+
+CHEESES = [(f"{100 + i}", f"Cheddar Cheese {i}") for i in range(7)] + [("200", "Whole Milk")]
+
+
+def pages(search, *args, limit=3):
+    # Every page of a search, following next_cursor until the last one
+    cursor, result = None, []
+    while True:
+        page = search(*args, limit=limit, cursor=cursor)
+        result.append(page.rows)
+        cursor = page.next_cursor
+        if cursor is None:
+            return result
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor("v1", "digest", [12, 3])
+    assert decode_cursor(cursor, "v1", "digest") == [12, 3]
+    assert decode_cursor(None, "v1", "digest") is None
+
+
+@pytest.mark.parametrize("cursor", ["not base64!", encode_cursor("v1", "digest", -1), encode_cursor("v1", "digest", [])])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(CursorError, match="Malformed"):
+        decode_cursor(cursor, "v1", "digest")
+
+
+def test_search_pages_cover_every_match_once(catalog_file):
+    catalog_file.write(CHEESES)
+    result = pages(search_products, "cheese")
+    assert [len(page) for page in result] == [3, 3, 1]
+    assert sum(result, []) == search_products("cheese", limit=100).rows
+
+
+def test_similar_pages_line_up_with_one_deep_page(catalog_file):
+    catalog_file.write(CHEESES)
+    result = pages(search_similar_products, "Cheddar Cheese 0", limit=2)
+    assert len(result) > 1
+    assert sum(result, []) == search_similar_products("Cheddar Cheese 0", limit=100).rows
+
+
+def test_cursor_from_another_query_is_rejected(catalog_file):
+    catalog_file.write(CHEESES)
+    cursor = search_products("cheese", limit=2).next_cursor
+    with pytest.raises(CursorError, match="different query"):
+        search_products("cheddar", limit=2, cursor=cursor)
+
+
+def test_cursor_from_a_stale_catalog_is_rejected(catalog_file):
+    catalog_file.write(CHEESES)
+    cursor = search_products("cheese", limit=2).next_cursor
+    catalog_file.reload(CHEESES + [("300", "Cheese Curds")])
+    with pytest.raises(CursorError, match="catalog has changed"):
+        search_products("cheese", limit=2, cursor=cursor)
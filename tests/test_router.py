@@ -0,0 +1,22 @@
+import pytest
+from product_search.router import Route, route
+
+
+@pytest.mark.parametrize("query, argument", [
+    ("give me pizza links", "pizza"),
+    ("banana with links", "banana"),
+    ("salsa, and the links please", "salsa"),
+    ("find milk with a link", "milk"),
+])
+def test_link_phrase_keeps_product_words_whole(query, argument):
+    assert route(query) == Route("products", argument, True)
+
+
+@pytest.mark.parametrize("query", ["ok", "yes", "no", "cool", "okay thanks", "show me it"])
+def test_replies_are_not_routed_to_search(query):
+    assert route(query) is None
+
+
+@pytest.mark.parametrize("query, argument", [("milk", "milk"), ("tea", "tea"), ("find me some eggs", "eggs")])
+def test_product_queries_are_routed_to_search(query, argument):
+    assert route(query) == Route("products", argument, False)
@@ -0,0 +1,65 @@
+import asyncio
+import pytest
+from product_search import tool_calls
+from product_search.tool_calls import INVALID_PARAMS, INVALID_REQUEST, METHOD_NOT_FOUND, handle_batch, handle_message
+
+
+def call(id, query):
+    message = {"jsonrpc": "2.0", "method": "tools/call", "params": {"name": "get_products", "arguments": {"query": query}}}
+    if id is not None:
+        message["id"] = id
+    return message
+
+
+@pytest.fixture
+def slow_search(monkeypatch):
+    # get_products answers with its query after sleeping that many seconds, so calls finish out of order
+    async def get_products(query, cursor=None):
+        await asyncio.sleep(float(query))
+        return query
+    monkeypatch.setitem(tool_calls.tool_functions, "get_products", get_products)
+
+
+def test_batch_responses_keep_request_order(slow_search):
+    responses = asyncio.run(handle_batch([call(1, "0.05"), call(2, "0"), call(3, "0.02")]))
+    assert [response["id"] for response in responses] == [1, 2, 3]
+    assert [response["result"]["content"][0]["text"] for response in responses] == ["0.05", "0", "0.02"]
+
+
+def test_batch_leaves_out_notifications(slow_search):
+    batch = [
+        call(None, "0"),
+        {"jsonrpc": "2.0", "id": "a", "method": "tools/list"},
+        {"jsonrpc": "2.0", "method": "no/such/method"},
+        call(None, 42),
+        {"jsonrpc": "2.0", "id": "b", "method": "no/such/method"},
+        "not a request",
+    ]
+    responses = asyncio.run(handle_batch(batch))
+    assert [response["id"] for response in responses] == ["a", "b", None]
+    assert responses[1]["error"]["code"] == METHOD_NOT_FOUND
+    assert responses[2]["error"]["code"] == INVALID_REQUEST
+
+
+@pytest.mark.parametrize("message", [
+    call(None, "0"),
+    call(None, 42),
+    {"jsonrpc": "2.0", "method": "no/such/method"},
+    {"jsonrpc": "2.0", "method": "tools/call", "params": {"name": "no_such_tool"}},
+    {"jsonrpc": "2.0", "method": "tools/call", "params": ["get_products"]},
+])
+def test_notifications_get_no_response(slow_search, message):
+    assert asyncio.run(handle_message(message)) is None
+
+
+def test_all_notification_batch_has_no_responses(slow_search):
+    assert asyncio.run(handle_batch([call(None, "0"), call(None, 42)])) == []
+
+
+def test_invalid_arguments_are_an_error_for_requests(slow_search):
+    response = asyncio.run(handle_message(call(7, 42)))
+    assert response["id"] == 7 and response["error"]["code"] == INVALID_PARAMS
+
+
+def test_empty_batch_is_invalid():
+    assert asyncio.run(handle_batch([]))[0]["error"]["code"] == INVALID_REQUEST